@@ -0,0 +1,504 @@
+"""
+Benchmarks for the game.
+
+Runs headless on SDL's dummy video driver and prints the results as JSON.
+
+    python benchmark.py map-decode --sizes 64 256 1024
+    python benchmark.py map-load --sizes 256 1024
+    python benchmark.py frames --frames 600 --map-size 64 --entities 500
+    python benchmark.py present --frames 600
+    python benchmark.py sprites --counts 1000 10000 50000
+    python benchmark.py sprites --counts 10000 --spread 4
+    python benchmark.py replay session.tdrp
+    python benchmark.py static --counts 0 1000 5000
+    python benchmark.py static --counts 0 1000 5000 --awake
+"""
+
+# Imports:
+import argparse
+import json
+import os
+import tempfile
+import time
+import timeit
+
+# Has to be set before pygame starts up the display:
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+from gamebase import GameBase  # noqa: E402
+from character import CharacterClass  # noqa: E402
+from detect_col import CollisionDetection  # noqa: E402
+from loadmap import MapLoader  # noqa: E402
+from main import TestGame  # noqa: E402
+from replay import InputReplayer  # noqa: E402
+
+
+# The map TestGame loads if no size is given:
+MAP_PATH_DEFAULT = 'assets/map1.png'
+# Sprite the sprites benchmark draws:
+SPRITE_IMG = 'assets/box_character_16.png'
+
+
+# =============================
+# ---  Helpers  ---------------
+# =============================
+
+def make_map_surface(size: int, wall_chance: float = 0.2, seed: int = 0):
+    """ Makes a random map layout image of ground and walls """
+    rng = np.random.default_rng(seed)
+    colors = np.array([MapLoader.GROUND_COLOR, MapLoader.WALL_COLOR],
+                      dtype=np.uint8)
+    is_wall = rng.random((size, size)) < wall_chance
+    map_img = pygame.Surface((size, size))
+    pygame.surfarray.blit_array(map_img, colors[is_wall.astype(np.uint8)])
+    return map_img
+
+
+def make_game() -> GameBase:
+    """ Makes the game window the same size as the game uses """
+    return GameBase(1240, 760, 'Benchmark')
+
+
+def percentiles(times: list) -> dict:
+    """ Returns frame time stats in milliseconds """
+    ms = np.array(times) * 1000
+    return {
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+
+def entity_counts(game: GameBase) -> dict:
+    """ Returns how many entities and callbacks the game has """
+    return {
+        'characters': CharacterClass.s_instance_counter + 1,
+        'hitables': len(CollisionDetection.s_hitables),
+        'update_early_functions': len(GameBase.update_early_functions),
+        'update_event_functions': len(GameBase.update_event_functions),
+        'update_functions': len(GameBase.update_functions),
+        'update_late_functions': len(GameBase.update_late_functions),
+        'render_functions': len(GameBase.render_functions),
+        'dirty_rect_functions': len(GameBase.dirty_rect_functions),
+    }
+
+
+def make_test_game(args, temp_dir: str) -> TestGame:
+    """ Sets up TestGame on a random map with extra entities """
+    map_path = MAP_PATH_DEFAULT
+    if args.map_size:
+        map_path = os.path.join(temp_dir, f'map_{args.map_size}.png')
+        pygame.image.save(make_map_surface(args.map_size), map_path)
+    MapLoader.MAP_CACHE_DIR = os.path.join(temp_dir, 'map_cache')
+    test_game = TestGame(start=False, map_path=map_path,
+                         streaming=args.streaming)
+
+    # Extra entities spread over the map, all walking somewhere:
+    rng = np.random.default_rng(args.seed)
+    map_px = test_game.loaded_map.tile_map.get_grid_size()
+    map_px = [map_px[0] * MapLoader.TILE_SIZE, map_px[1] * MapLoader.TILE_SIZE]
+    for _ in range(args.entities):
+        entity = CollisionDetection(game=test_game.game,
+                                    char_img_path=test_game.player_img,
+                                    tag=CollisionDetection.TAG_ENEMY)
+        entity.set_position([float(rng.uniform(0, map_px[0])),
+                             float(rng.uniform(0, map_px[1]))])
+        entity.set_input_direction([int(rng.integers(-1, 2)),
+                                    int(rng.integers(-1, 2))])
+    return test_game
+
+
+def best_time(funct, repeat: int) -> float:
+    """ Returns the fastest of a few runs in seconds """
+    return min(timeit.repeat(funct, number=1, repeat=repeat))
+
+
+# =============================
+# ---  Benchmarks  ------------
+# =============================
+
+def bench_map_decode(args) -> list:
+    """ Map image decoding: the old per pixel loops vs numpy """
+    results = []
+    for size in args.sizes:
+        map_img = make_map_surface(size)
+        loops = MapLoader.decode_tile_types_loops(map_img)
+        vectorized = MapLoader.decode_tile_types(map_img)
+        loops_s = best_time(
+            lambda: MapLoader.decode_tile_types_loops(map_img), args.repeat)
+        numpy_s = best_time(
+            lambda: MapLoader.decode_tile_types(map_img), args.repeat)
+        results.append({
+            'size': size,
+            'loops_s': loops_s,
+            'numpy_s': numpy_s,
+            'speedup': loops_s / numpy_s,
+            'same_result': bool(np.array_equal(loops, vectorized)),
+        })
+    return results
+
+
+def bench_map_load(args) -> list:
+    """ MapLoader start up with a cold and a warm compiled map cache """
+    game = make_game()
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        MapLoader.MAP_CACHE_DIR = os.path.join(temp_dir, 'map_cache')
+        for size in args.sizes:
+            map_path = os.path.join(temp_dir, f'map_{size}.png')
+            pygame.image.save(make_map_surface(size), map_path)
+
+            def load(use_map_cache):
+                start = time.perf_counter()
+                MapLoader(game, map_path, streaming=not args.full,
+                          use_map_cache=use_map_cache)
+                return time.perf_counter() - start
+
+            # Each cold run starts without a compiled file:
+            cache_path = MapLoader.get_map_cache_path(map_path)
+            no_cache = []
+            cold = []
+            warm = []
+            for _ in range(args.repeat):
+                no_cache.append(load(False))
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+                cold.append(load(True))
+                warm.append(load(True))
+            results.append({
+                'size': size,
+                'streaming': not args.full,
+                'no_cache_s': min(no_cache),
+                'cold_s': min(cold),
+                'warm_s': min(warm),
+                'cache_bytes': os.path.getsize(cache_path),
+            })
+    return results
+
+
+def bench_frames(args) -> dict:
+    """ TestGame frame times, uncapped with a fixed delta """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.trace:
+            # Started before the map loads so loading is in the trace:
+            GameBase.start_trace(args.trace)
+        test_game = make_test_game(args, temp_dir)
+        game = test_game.game
+        game.max_fps = 0
+        game.call_ready()
+        test_game.hud.show(args.hud)
+        if args.fixed_step:
+            game.set_fixed_step(args.fixed_step)
+        if args.dirty_rects:
+            game.set_dirty_rect_mode(True)
+        if args.phases:
+            game.enable_profiler(args.frames)
+        if args.callbacks:
+            game.enable_callback_sampler(args.callbacks,
+                                         args.frames // args.callbacks)
+
+        for _ in range(args.warmup):
+            game.run_frame(args.delta)
+
+        times = []
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            game.run_frame(args.delta)
+            times.append(time.perf_counter() - start)
+        trace = game.stop_trace()
+
+    results = {
+        'frames': args.frames,
+        'delta': args.delta,
+        'map_size': test_game.loaded_map.tile_map.get_grid_size(),
+        'streaming': args.streaming,
+        'extra_entities': args.entities,
+        'counts': entity_counts(game),
+        'entity_store': CharacterClass.s_store.get_stats(),
+        'proximity': test_game.proximity.get_stats(),
+        'frame_times': percentiles(times),
+        'present_mode': GameBase.present_mode,
+        'present_allocations': GameBase.present_allocations,
+    }
+    if args.dirty_rects:
+        results['dirty_rects'] = {
+            'full_redraws': GameBase.full_redraw_count,
+            'dirty_redraws': GameBase.dirty_redraw_count,
+        }
+    if args.fixed_step:
+        results['fixed_step'] = {
+            'tick_rate': args.fixed_step,
+            'dropped_time': GameBase.dropped_time,
+        }
+    if args.phases:
+        results['phases'] = game.get_phase_stats()
+    if args.callbacks:
+        results['top_callbacks'] = game.get_top_callbacks()
+    if trace:
+        results['trace'] = trace
+    return results
+
+
+def bench_present(args) -> dict:
+    """ Present step: a new scaled surface each frame vs GameBase.present """
+    game = make_game()
+    noise = np.random.default_rng(0).integers(
+        0, 256, game.display.get_size() + (3,), dtype=np.uint8)
+    pygame.surfarray.blit_array(game.display, noise)
+
+    def allocating():
+        # How present worked before, a new window sized surface a frame:
+        surf = pygame.transform.scale(game.display, GameBase.window_size)
+        GameBase.window.blit(surf, (0, 0))
+        pygame.display.update()
+
+    allocations = GameBase.present_allocations
+    allocating_s = best_time(
+        lambda: [allocating() for _ in range(args.frames)], args.repeat)
+    present_s = best_time(
+        lambda: [game.present() for _ in range(args.frames)], args.repeat)
+    return {
+        'frames': args.frames,
+        'present_mode': GameBase.present_mode,
+        'allocating_ms': allocating_s / args.frames * 1000,
+        'present_ms': present_s / args.frames * 1000,
+        'present_allocations': GameBase.present_allocations - allocations,
+    }
+
+
+def bench_sprites(args) -> list:
+    """ Frame times with many moving sprites through the render queue """
+    game = make_game()
+    game.max_fps = 0
+    rng = np.random.default_rng(args.seed)
+    # Sprites are spread over spread times the display each way,
+    # the ones off the display are culled by the camera:
+    width, height = game.display.get_size()
+    width *= args.spread
+    height *= args.spread
+    sprites = []
+    results = []
+    # Counts go up, so each run adds to the sprites of the last:
+    for count in sorted(args.counts):
+        while len(sprites) < count:
+            sprite = CharacterClass(game, SPRITE_IMG)
+            sprite.set_position([float(rng.uniform(0, width)),
+                                 float(rng.uniform(0, height))])
+            sprite.set_input_direction([int(rng.integers(-1, 2)),
+                                        int(rng.integers(-1, 2))])
+            sprites.append(sprite)
+
+        for _ in range(args.warmup):
+            game.run_frame(args.delta)
+        times = []
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            game.run_frame(args.delta)
+            times.append(time.perf_counter() - start)
+
+        # The same sprites drawn with one blits call vs a blit each:
+        game.render_loop(1.0)
+        queued = [pair for layer in GameBase.render_blits for pair in layer]
+        for layer in GameBase.render_blits + GameBase.render_draws:
+            layer.clear()
+        display = game.display
+        blits_s = best_time(
+            lambda: display.blits(queued, doreturn=False), args.repeat)
+        blit_each_s = best_time(
+            lambda: [display.blit(surf, pos) for surf, pos in queued],
+            args.repeat)
+
+        results.append({
+            'sprites': count,
+            'drawn': len(queued),
+            'frame_times': percentiles(times),
+            'blits_ms': blits_s * 1000,
+            'blit_each_ms': blit_each_s * 1000,
+        })
+    return results
+
+
+def bench_replay(args) -> dict:
+    """ TestGame frame times replaying a recorded play session """
+    test_game = TestGame(start=False, streaming=args.streaming)
+    game = test_game.game
+    game.max_fps = 0
+    game.call_ready()
+    test_game.hud.show(args.hud)
+    if args.dirty_rects:
+        game.set_dirty_rect_mode(True)
+    replayer = InputReplayer(game, test_game.player_input, args.log)
+    if args.phases:
+        game.enable_profiler(len(replayer))
+
+    times = []
+    while True:
+        start = time.perf_counter()
+        if not replayer.play_frame():
+            break
+        times.append(time.perf_counter() - start)
+
+    results = {
+        'log': args.log,
+        'frames': len(replayer),
+        'sim_time': replayer.get_sim_time(),
+        'tick_rate': replayer.tick_rate,
+        'frame_times': percentiles(times) if times else {},
+        # Should match between builds if the sim hasn't changed:
+        'player_position': test_game.player.get_position(),
+        'rays_cast': CollisionDetection.s_rays_cast,
+    }
+    if args.phases:
+        results['phases'] = game.get_phase_stats()
+    return results
+
+
+def bench_static(args) -> list:
+    """ TestGame frame times with more and more static crates """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        test_game = make_test_game(args, temp_dir)
+        game = test_game.game
+        game.max_fps = 0
+        game.call_ready()
+        if args.fixed_step:
+            game.set_fixed_step(args.fixed_step)
+        if args.dirty_rects:
+            game.set_dirty_rect_mode(True)
+
+        rng = np.random.default_rng(args.seed + 1)
+        map_px = test_game.loaded_map.tile_map.get_grid_size()
+        map_px = [map_px[0] * MapLoader.TILE_SIZE,
+                  map_px[1] * MapLoader.TILE_SIZE]
+        crates = 0
+        results = []
+        # Counts go up, so each run adds to the crates of the last:
+        for count in sorted(args.counts):
+            while crates < count:
+                crate = CollisionDetection(
+                    game=game, char_img_path=test_game.player_img,
+                    tag=CollisionDetection.TAG_WORLD,
+                    is_static=not args.awake)
+                crate.set_position([float(rng.uniform(0, map_px[0])),
+                                    float(rng.uniform(0, map_px[1]))])
+                crates += 1
+
+            for _ in range(args.warmup):
+                game.run_frame(args.delta)
+            times = []
+            for _ in range(args.frames):
+                start = time.perf_counter()
+                game.run_frame(args.delta)
+                times.append(time.perf_counter() - start)
+
+            results.append({
+                'crates': count,
+                'awake': args.awake,
+                'counts': entity_counts(game),
+                'static_layer': CharacterClass.s_static_layer.get_stats(),
+                'frame_times': percentiles(times),
+            })
+    return results
+
+
+def add_game_args(parser) -> None:
+    """ Arguments for benchmarks that run TestGame """
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--warmup', type=int, default=60)
+    parser.add_argument('--delta', type=float, default=1 / 120)
+    parser.add_argument('--map-size', type=int, default=0,
+                        help='random square map, 0 for the game map')
+    parser.add_argument('--streaming', action='store_true',
+                        help='stream the map in chunks')
+    parser.add_argument('--entities', type=int, default=0,
+                        help='extra CollisionDetection entities')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hud', action='store_true',
+                        help='draw the performance HUD')
+    parser.add_argument('--fixed-step', type=int, default=0,
+                        metavar='TICK_RATE',
+                        help='fixed sim steps per second, 0 for off')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='redraw only what changed on screen')
+
+
+# =============================
+# ---  Command line  ----------
+# =============================
+
+def main():
+    """ Parses the command line and runs a benchmark """
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    map_decode = commands.add_parser(
+        'map-decode', help=bench_map_decode.__doc__)
+    map_decode.add_argument('--sizes', type=int, nargs='+',
+                            default=[64, 256, 1024])
+    map_decode.add_argument('--repeat', type=int, default=3)
+    map_decode.set_defaults(funct=bench_map_decode)
+
+    map_load = commands.add_parser('map-load', help=bench_map_load.__doc__)
+    map_load.add_argument('--sizes', type=int, nargs='+', default=[256, 1024])
+    map_load.add_argument('--repeat', type=int, default=3)
+    map_load.add_argument('--full', action='store_true',
+                          help='bake the whole map instead of streaming')
+    map_load.set_defaults(funct=bench_map_load)
+
+    frames = commands.add_parser('frames', help=bench_frames.__doc__)
+    add_game_args(frames)
+    frames.add_argument('--phases', action='store_true',
+                        help='also time each phase of the loop')
+    frames.add_argument('--callbacks', type=int, default=0, metavar='N',
+                        help='time each callback every N frames')
+    frames.add_argument('--trace', metavar='PATH',
+                        help='write a Chrome trace JSON file')
+    frames.set_defaults(funct=bench_frames)
+
+    present = commands.add_parser('present', help=bench_present.__doc__)
+    present.add_argument('--frames', type=int, default=600)
+    present.add_argument('--repeat', type=int, default=3)
+    present.set_defaults(funct=bench_present)
+
+    sprites = commands.add_parser('sprites', help=bench_sprites.__doc__)
+    sprites.add_argument('--counts', type=int, nargs='+',
+                         default=[1000, 10000, 50000])
+    sprites.add_argument('--frames', type=int, default=60)
+    sprites.add_argument('--warmup', type=int, default=5)
+    sprites.add_argument('--delta', type=float, default=1 / 120)
+    sprites.add_argument('--repeat', type=int, default=3)
+    sprites.add_argument('--spread', type=int, default=1,
+                         help='world size in displays each way')
+    sprites.add_argument('--seed', type=int, default=0)
+    sprites.set_defaults(funct=bench_sprites)
+
+    replay = commands.add_parser('replay', help=bench_replay.__doc__)
+    replay.add_argument('log', help='file saved with main.py --record')
+    replay.add_argument('--streaming', action='store_true',
+                        help='stream the map in chunks')
+    replay.add_argument('--hud', action='store_true',
+                        help='draw the performance HUD')
+    replay.add_argument('--dirty-rects', action='store_true',
+                        help='redraw only what changed on screen')
+    replay.add_argument('--phases', action='store_true',
+                        help='also time each phase of the loop')
+    replay.set_defaults(funct=bench_replay)
+
+    static = commands.add_parser('static', help=bench_static.__doc__)
+    add_game_args(static)
+    static.add_argument('--counts', type=int, nargs='+',
+                        default=[0, 1000, 5000])
+    static.add_argument('--awake', action='store_true',
+                        help='make the crates awake, to compare')
+    static.set_defaults(funct=bench_static)
+
+    args = parser.parse_args()
+    pygame.init()
+    print(json.dumps(args.funct(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Camera
+
+Follows a target around the world and turns world coords
+in to display coords.
+
+Everything in the world keeps its own world position.
+The camera works out where the view is once a frame
+and every thing is drawn that much to the side,
+instead of every entity moving itself when the camera moves.
+"""
+
+# Imports:
+import math
+import pygame
+
+
+class Camera:
+    """ View of the world that eases after a target """
+
+    # The view moves 1 / SMOOTH_AMT of the way to the target each step:
+    SMOOTH_AMT = 20
+    # The target can be this far from the center before the view moves:
+    SNAP_DIST = 5
+
+    def __init__(self, game, view_size):
+        """ Class initilizer
+
+        Args:
+            game (GameBase): The game, for dirty rect rendering.
+            view_size: Width and height of the display.
+        """
+        self.game = game
+        self.view_size = (int(view_size[0]), int(view_size[1]))
+        self.center = [view_size[0] / 2, view_size[1] / 2]
+        # World point at the top left of the display:
+        self.position = [0.0, 0.0]
+        # Position at the start of the sim step, drawn between the two:
+        self.prev_position = [0.0, 0.0]
+        self.target = None
+        # How far the view center is from the target, 0 when close:
+        self.target_offset = [0, 0]
+
+        # Worked out once a frame in begin_frame.
+        # Whole pixels to take off world coords to get display coords:
+        self.offset = [0, 0]
+        # The part of the world on the display:
+        self.view_rect = pygame.Rect((0, 0), self.view_size)
+        # The display itself, in display coords:
+        self.screen_rect = pygame.Rect((0, 0), self.view_size)
+        # Offset of the last frame drawn, for dirty rect rendering:
+        self.drawn_offset = None
+
+    # =============================
+    # --- Setters and Getters : ---
+    # =============================
+
+    def set_target(self, target) -> None:
+        """ Sets what the camera follows, anything with get_position """
+        self.target = target
+
+    def set_position(self, position: list) -> None:
+        """ Jumps the top left of the view to a world point """
+        self.position = [position[0], position[1]]
+        self.prev_position = [position[0], position[1]]
+
+    def center_on(self, position: list) -> None:
+        """ Jumps the center of the view to a world point """
+        self.set_position([position[0] - self.center[0],
+                           position[1] - self.center[1]])
+
+    def get_view_rect(self) -> pygame.Rect:
+        """ Returns the part of the world on the display this frame """
+        return self.view_rect
+
+    def get_offset(self) -> list:
+        """ Returns what to take off world coords to draw them """
+        return self.offset
+
+    # =============================
+    # ---  Coords  ----------------
+    # =============================
+
+    def world_to_screen(self, x, y) -> list:
+        """ Returns where a world point is on the display """
+        return [x - self.offset[0], y - self.offset[1]]
+
+    def screen_to_world(self, x, y) -> list:
+        """ Returns the world point under a display point """
+        return [x + self.offset[0], y + self.offset[1]]
+
+    def is_on_screen(self, rect: pygame.Rect) -> bool:
+        """ Returns if a rect in display coords is on the display """
+        return self.screen_rect.colliderect(rect)
+
+    # =============================
+    # ---  Update loop  -----------
+    # =============================
+
+    def early_update(self, delta) -> None:
+        """ Keeps the position from before this sim step """
+        self.prev_position[0] = self.position[0]
+        self.prev_position[1] = self.position[1]
+
+    def update(self, delta) -> None:
+        """ Eases the view toward the target, after it has moved """
+        if self.target is None:
+            return
+        target_pos = self.target.get_position()
+        x = self.center[0] - (target_pos[0] - self.position[0])
+        y = self.center[1] - (target_pos[1] - self.position[1])
+
+        # if x and y are close enough to zero just set it to zero.
+        snap = self.SNAP_DIST
+        x = 0 if -snap <= x <= snap else x
+        y = 0 if -snap <= y <= snap else y
+        self.target_offset = [x, y]
+
+        self.position[0] -= x / self.SMOOTH_AMT
+        self.position[1] -= y / self.SMOOTH_AMT
+
+    def begin_frame(self, alpha) -> None:
+        """ Works out the view for the frame about to be drawn,
+            between the last two sim steps
+        """
+        prev = self.prev_position
+        pos = self.position
+        # Whole pixels so the map and sprites move together:
+        self.offset = [math.floor(prev[0] + (pos[0] - prev[0]) * alpha),
+                       math.floor(prev[1] + (pos[1] - prev[1]) * alpha)]
+        self.view_rect.topleft = self.offset
+
+    def report_dirty_rect(self, alpha) -> None:
+        """ Redraws everything when the view has moved """
+        if self.offset != self.drawn_offset:
+            self.game.request_full_redraw()
+            self.drawn_offset = list(self.offset)
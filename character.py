@@ -4,8 +4,10 @@ Character Class
 The base class for all characters or entities in the game.
 Even for the simple images.
 
-This class handles the movement of all items in the game
-including the movement to simulate camera movement.
+This class handles the movement of all items in the game.
+The positions, velocities and speeds of every character are kept
+in one EntityStore and moved together each sim step,
+a character is a handle to its row in the store.
 
 All other entitiy or game objects in the game would
 inharit from this class.
@@ -21,6 +23,8 @@ import pygame
 import gamebase
 import math
 from typing import Callable
+from entity_store import EntityStore
+from static_layer import StaticLayer
 
 
 class CharacterClass:
@@ -30,7 +34,6 @@ class CharacterClass:
 
     # Static properties for all instances:
     # Constant Vars:
-    CAM_SMOOTH_AMT = 20
     # Tags: Can probably be used an an enum. But I like it this way.
     TAG_WORLD = 'world'
     TAG_PLAYER = 'player'
@@ -44,15 +47,23 @@ class CharacterClass:
     s_instance_counter = -1
     s_cam_pos_relitve_to_target = [0, 0]
     s_cam_target = None
+    # Positions, velocities and speeds of every character:
+    s_store: EntityStore = None
+    # Draws the sleeping characters:
+    s_static_layer: StaticLayer = None
 
     # Information about the player for all to have access to:
     s_player_position = [0, 0]
     s_player = None
+    # Keyed by id. The near ones are filled by the ProximityTracker,
+    # hitting the player by CollisionDetection:
     s_chars_near_player = {}
     s_chars_near_projectile = {}
     s_chars_hitting_player = {}
     s_chars_near_target = {}
     s_player_dist_max = 50
+    # Every character tagged as a projectile, keyed by id:
+    s_projectiles = {}
 
     def __init__(
             self,
@@ -64,6 +75,12 @@ class CharacterClass:
         # Make sure all instances use same game object:
         if CharacterClass.game is None:
             CharacterClass.game = game
+        # Made with the first character, it moves all of them:
+        if CharacterClass.s_store is None:
+            CharacterClass.s_store = EntityStore(game)
+            CharacterClass.s_static_layer = StaticLayer(
+                game, CharacterClass.s_store)
+            game.add_to_update_functions(CharacterClass.update_statics)
         # Adds to instance counter:
         CharacterClass.s_instance_counter += 1
         # Set up defaults:
@@ -73,7 +90,8 @@ class CharacterClass:
             'name': "",
             'tag': None,
             'speed': self.DEFAULT_SPEED,
-            'is_collidable': False
+            'is_collidable': False,
+            'is_static': False
         }
         defaults.update(kwargs)
 
@@ -83,23 +101,28 @@ class CharacterClass:
         tag: str = defaults['tag']
         speed: int = defaults['speed']
         is_collidable: bool = defaults['is_collidable']
+        is_static: bool = defaults['is_static']
 
         self.tag = tag
         self.name = name
         self.id = CharacterClass.s_instance_counter
 
+        # Render queue layer, the player draws over everything else:
+        self.render_layer = game.LAYER_ENTITIES
         # Set up player static protperties:
         if self.tag == CharacterClass.TAG_PLAYER:
+            self.render_layer = game.LAYER_PLAYER
             if CharacterClass.s_cam_target is None:
-                CharacterClass.s_cam_target = self
+                self.set_cam_target(self)
             if CharacterClass.s_player is None:
                 CharacterClass.s_player = self
+        if self.tag == CharacterClass.TAG_PROJECTILE:
+            CharacterClass.s_projectiles[self.id] = self
 
-        self.character_pos: list = [pos_x, pos_y]
-        self.character_velocity = [0, 0]
+        # Position, velocity and speed are in the store's row:
+        self.slot = CharacterClass.s_store.add(self, [pos_x, pos_y], speed)
         self.last_dir_moved = [1, 0]  # defaults last direction pressed to right # noqa
         self.last_angle_moved = 0
-        self.character_speed = speed
         self.view_distance = 300
         self.draw_rect = False
         self.is_force_stop_on = False
@@ -115,15 +138,23 @@ class CharacterClass:
         self.hit_box_walls_size = self.img_half_width
         self.hit_box_dmg_size = self.hit_box_walls_size * 0.75
         self.rect = pygame.Rect(
-            self.character_pos[0],
-            self.character_pos[1],
-            self.img.get_width(),
-            self.img.get_height()
+            CharacterClass.s_store.get_rect_position(self.slot),
+            self.img.get_size()
         )
 
-        # Adds the update method to game loop:
-        self.add_method_to_update_early_game_loop(self.early_update)
-        self.add_method_to_update_game_loop(self.update)
+        # Display rect it was last drawn at, for dirty rect rendering:
+        self.drawn_rect = None
+        self.drawn_debug = False
+
+        # Moved by the store, only drawing is left per character.
+        # Static ones sleep in the static layer instead,
+        # with nothing called for them per frame until they're woken:
+        self.is_static = is_static
+        self.is_sleeping = False
+        if is_static:
+            self._fall_asleep()
+        else:
+            self._join_frame_loops()
 
     # =============================
     # --- Setters and Getters : ---
@@ -146,23 +177,32 @@ class CharacterClass:
     def set_cam_target(self, target):
         """ Sets the target object for the camera to follow """
         CharacterClass.s_cam_target = target
+        self.game.camera.set_target(target)
 
     def set_draw_rect(self, b: bool) -> None:
         """ Sets bool to either draw rect or not over img. """
         self.draw_rect = b
+        # Static ones wake up to draw it:
+        self._update_sleep()
 
     def set_position(self, pos_vector: list) -> None:
         """ manually sets character position
             Good for teleports or placing something.
         """
         pos_vector = self.convert_tuple_list(pos_vector)
-        self.character_pos = pos_vector
-        self.rect.x = pos_vector[0]
-        self.rect.y = pos_vector[1]
+        store = CharacterClass.s_store
+        old_rect = self.rect.copy()
+        # Jumps straight there instead of sliding between steps:
+        store.set_position(self.slot, pos_vector)
+        self.rect.topleft = store.get_rect_position(self.slot)
+        self._position_changed()
+        # Asleep it's only drawn somewhere else:
+        if self.is_sleeping:
+            CharacterClass.s_static_layer.move(self, old_rect)
 
     def set_speed(self, speed: int) -> None:
         """ Sets character speed """
-        self.character_speed = speed
+        CharacterClass.s_store.set_speed(self.slot, speed)
 
     def set_name(self, name: str) -> None:
         """ Gives the character a name """
@@ -171,10 +211,28 @@ class CharacterClass:
     def set_tag(self, tag: str) -> None:
         """ Gives the character a Tag """
         self.tag = tag
+        if tag == CharacterClass.TAG_PROJECTILE:
+            CharacterClass.s_projectiles[self.id] = self
+        else:
+            CharacterClass.s_projectiles.pop(self.id, None)
+
+    def set_render_layer(self, layer: int) -> None:
+        """ Sets the render queue layer it's drawn on """
+        self.render_layer = layer
 
     def set_is_movable(self, b: bool) -> None:
         """ Set if character is movable """
         self.is_movable = b
+        CharacterClass.s_store.set_flag(
+            self.slot, EntityStore.FLAG_MOVABLE, b)
+
+    def set_is_static(self, b: bool) -> None:
+        """ Set if character sleeps whenever it's not moving or hit """
+        self.is_static = b
+        if b:
+            self._update_sleep()
+        else:
+            self.wake()
 
     def set_is_collidable(self, b: bool) -> None:
         """ Set if character is collidable """
@@ -195,6 +253,7 @@ class CharacterClass:
         # sets input to 0,0 if no movement is allowed:
         if not self.is_movable:
             self.input_direction = [0, 0]
+            self.input_to_velocity()
             return
 
         # incase a tuple is entered:
@@ -207,6 +266,9 @@ class CharacterClass:
             self.set_last_angle_moved_by_vector(norm.copy())
         # Sets sets direction:
         self.input_direction = norm.copy()
+        # While it's possible to change later for physics,
+        # I'm just directly making velocity vector equal to input vector
+        self.input_to_velocity()
 
     def get_last_angle_moved(self) -> list:
         """ Returns the last_angle_moved property """
@@ -218,7 +280,21 @@ class CharacterClass:
 
     def get_position(self) -> list:
         """ returns characters position """
-        return self.character_pos
+        return CharacterClass.s_store.get_position(self.slot)
+
+    def get_speed(self) -> float:
+        """ Returns character speed """
+        return float(CharacterClass.s_store.speed[self.slot])
+
+    def get_velocity(self) -> list:
+        """ Returns the velocity or 'Move' direction """
+        return CharacterClass.s_store.velocity[self.slot].tolist()
+
+    def get_render_position(self, alpha: float = 1.0) -> list:
+        """ Returns the position between the last sim step and this one
+            to draw at. alpha 0 is the last step, 1 is this one.
+        """
+        return CharacterClass.s_store.get_render_position(self.slot, alpha)
 
     def get_last_dir_moved(self) -> list:
         """ gets the last_dir_moved property """
@@ -257,50 +333,73 @@ class CharacterClass:
         """ sets the velocity or 'Move' direction """
         # Any case a tuple is sent through:
         vector = self.convert_tuple_list(vector)
-        self.character_velocity[0] = vector[0]
-        self.character_velocity[1] = vector[1]
+        CharacterClass.s_store.set_velocity(self.slot, vector)
+        # Static ones wake up to move:
+        self._update_sleep()
 
     # =============================
-    # ---  Camera Methods  ------
+    # ---  Sleeping  --------------
     # =============================
 
-    def _adujust_pos_to_sim_cam(self, pos: list, delta) -> list:
-        """ The Final xy coords to be sent to display.blitz """
-        # Tweens the camera movement in a linier tween
+    def sleep(self) -> None:
+        """ Takes the character out of the per frame loops,
+            the static layer draws it until it's woken.
+        """
+        if self.is_sleeping:
+            return
+        self.game.remove_from_render_functions(self.render)
+        self.game.remove_from_dirty_rect_functions(self.report_dirty_rect)
+        self._fall_asleep()
 
-        # any case a tuple is sent through:
-        pos = self.convert_tuple_list(pos)
-
-        pos[0] = pos[0] + CharacterClass.s_cam_pos_relitve_to_target[0] / \
-            self.CAM_SMOOTH_AMT
-        pos[1] = pos[1] + CharacterClass.s_cam_pos_relitve_to_target[1] / \
-            self.CAM_SMOOTH_AMT
-
-        # I did not write to pos var cause it was causing odd bugs
-        pos_x = pos[0]
-        pos_y = pos[1]
-        # This helps from tile tearing and collapsing
-        px = math.floor(pos_x)
-        py = math.floor(pos_y)
-        return [px, py]
-
-    def simple_dist_b_sub_a(self, a, b, near_0: int = 5) -> list:
-        """ Checks Distance of a to b """
-        x = b[0] - a[0]
-        y = b[1] - a[1]
-
-        # if x and y are close enough to zero just set it to zero.
-        x = 0 if x <= near_0 and x >= -near_0 else x
-        y = 0 if y <= near_0 and y >= -near_0 else y
-        return [x, y]
+    def wake(self) -> None:
+        """ Puts the character back in the per frame loops """
+        if not self.is_sleeping:
+            return
+        self.is_sleeping = False
+        CharacterClass.s_store.set_flag(
+            self.slot, EntityStore.FLAG_SLEEPING, False)
+        CharacterClass.s_static_layer.remove(self)
+        # The static layer marked where it was:
+        self.drawn_rect = None
+        self._join_frame_loops()
+
+    def can_sleep(self) -> bool:
+        """ Returns if nothing needs doing for it per frame """
+        return (not self.draw_rect
+                and not CharacterClass.s_store.velocity[self.slot].any())
+
+    def _update_sleep(self) -> None:
+        """ Sleeps or wakes a static character as needed """
+        if not self.is_static:
+            return
+        if self.can_sleep():
+            self.sleep()
+        else:
+            self.wake()
+
+    def _fall_asleep(self) -> None:
+        """ Hands the character to the static layer """
+        self.is_sleeping = True
+        CharacterClass.s_store.set_flag(
+            self.slot, EntityStore.FLAG_SLEEPING, True)
+        CharacterClass.s_static_layer.add(self)
+
+    def _join_frame_loops(self) -> None:
+        """ Draws the character itself every frame """
+        self.add_method_to_render_game_loop(self.render)
+        self.game.add_to_dirty_rect_functions(self.report_dirty_rect)
+
+    # =============================
+    # ---  Camera Methods  ------
+    # =============================
 
     def move_cam_to_target(self) -> None:
-        """ Moves the camera to the target object """
+        """ Keeps s_cam_pos_relitve_to_target up to date.
+            The game's Camera does the following now.
+        """
         if self == CharacterClass.s_cam_target:
-            CharacterClass.s_cam_pos_relitve_to_target = self.simple_dist_b_sub_a(  # noqa
-                self.get_position(),
-                self.game.dis_center
-            )
+            CharacterClass.s_cam_pos_relitve_to_target = \
+                self.game.camera.target_offset
 
     def input_to_velocity(self):
         """ Directly adding input direction in to velocity"""
@@ -311,6 +410,12 @@ class CharacterClass:
     # --  Other Random Methods  ---
     # =============================
 
+    def _position_changed(self) -> None:
+        """ Called after the rect has been moved.
+            Sub classes use it to keep indexes up to date.
+        """
+        pass
+
     def convert_tuple_list(self, item) -> list:
         """ Converts a tuple to a list
         to be used with the rest of the code"""
@@ -324,45 +429,76 @@ class CharacterClass:
     # --  Update loop for game  ---
     # =============================
 
-    def update(self, delta) -> None:
-        """ The function that gets sent to the game loop """
-
-        # While it's possible to change later for physics,
-        # I'm just directly making velocity vector equal to input vector
-        self.input_to_velocity()
-
-        # setting character position based on speed, delta, and velocity:
-        self.character_pos[0] += self.character_velocity[0] * self.character_speed * delta  # noqa
-        self.character_pos[1] += self.character_velocity[1] * self.character_speed * delta  # noqa
-        self.rect.x = self.character_pos[0]
-        self.rect.y = self.character_pos[1]
-
-        # Updates images based on 'Camera Movement'
-        pos_to_blit = self._adujust_pos_to_sim_cam(
-            self.character_pos, delta)
-
-        # Send image to be drawn on screen.
-        self.game.display.blit(
-            self.img, (pos_to_blit[0], pos_to_blit[1]))
-
-        # Updating Cam to follow target:
-        self.move_cam_to_target()
+    @staticmethod
+    def update_statics(delta) -> None:
+        """ Updates the shared player and camera info,
+            after the store has moved everything.
+        """
+        # Camera info for anything still reading it:
+        target = CharacterClass.s_cam_target
+        if target is not None:
+            target.move_cam_to_target()
 
         # Updateing static Player position for all to see:
-        if self.tag == CharacterClass.TAG_PLAYER:
-            CharacterClass.s_player_position = self.get_position()
+        if CharacterClass.s_player is not None:
+            CharacterClass.s_player_position = \
+                CharacterClass.s_player.get_position()
+
+    def get_draw_rect(self, alpha) -> pygame.Rect:
+        """ Returns the display rect the image is drawn at """
+        game = self.game
+        # Worked out for every character at once, once a frame:
+        positions = CharacterClass.s_store.get_draw_positions(
+            alpha, game.camera.offset, game.frame_count)
+        return pygame.Rect(positions[self.slot], self.img.get_size())
+
+    def get_screen_rect(self) -> pygame.Rect:
+        """ Returns the collision rect in display coords """
+        offset = self.game.camera.offset
+        return self.rect.move(-offset[0], -offset[1])
+
+    def render(self, alpha) -> None:
+        """ Draws the character between its last two positions,
+            if it's on the display
+        """
+        # Fell asleep this frame, the static layer draws it now:
+        if self.is_sleeping:
+            return
+        rect = self.get_draw_rect(alpha)
+        if not self.game.camera.is_on_screen(rect):
+            return
+        # Send image to be drawn on screen.
+        self.game.queue_blit(self.img, rect, self.render_layer)
 
         # Color over the object with a rect
         # Used more as a debuger to see if object was hit:
         if self.draw_rect:
-            pygame.draw.rect(self.game.display, (20, 200, 20), self.rect)
+            self.game.queue_draw(self.draw_debug_rect, self.render_layer)
 
-    # These are here if it's needed later.
-    # Probably will delete them though.
-    def early_update(self, delta) -> None:
-        """ add these methods to game early update loop """
-        pass
+    def draw_debug_rect(self) -> None:
+        """ Colors over the collision rect """
+        pygame.draw.rect(self.game.display, (20, 200, 20),
+                         self.get_screen_rect())
 
+    def report_dirty_rect(self, alpha) -> None:
+        """ Marks where it was and will be drawn if it moved.
+            The camera redraws everything when it moves.
+        """
+        rect = self.get_draw_rect(alpha)
+        if self.draw_rect:
+            rect.union_ip(self.get_screen_rect())
+        # The debug rect can turn on or off without moving:
+        if rect == self.drawn_rect and self.draw_rect == self.drawn_debug:
+            return
+        if self.drawn_rect is None:
+            self.game.add_dirty_rect(rect)
+        else:
+            self.game.add_dirty_rect(rect.union(self.drawn_rect))
+        self.drawn_rect = rect
+        self.drawn_debug = self.draw_rect
+
+    # This is here if it's needed later.
+    # Probably will delete it though.
     def late_update(self, delta) -> None:
         """ add these methods to game late update loop """
         pass
@@ -378,3 +514,7 @@ class CharacterClass:
     def add_method_to_update_game_loop(self, method: Callable):
         """ Adds methods to a list to be sent to the gameloop """
         self.game.add_to_update_functions(method)
+
+    def add_method_to_render_game_loop(self, method: Callable):
+        """ Adds methods that draw to the render loop """
+        self.game.add_to_render_functions(method)
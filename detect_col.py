@@ -7,8 +7,10 @@ Player, NPC, and projectile classes.
 
 # Imports:
 import math
+import numpy as np
 import pygame
 from character import CharacterClass
+from spatial_grid import SpatialGrid
 
 
 class CollisionDetection(CharacterClass):
@@ -17,12 +19,33 @@ class CollisionDetection(CharacterClass):
     # static properties:
     s_hitables = []
     s_player_hit_rect = False
+    # Spatial index of everything in s_hitables:
+    s_grid = SpatialGrid()
+    # The loaded tile map the ray casts hit walls in. Set by the MapLoader.
+    s_tile_map = None
+    # How many rays have been cast, for the performance HUD:
+    s_rays_cast = 0
+    # True once the player overlap pass is in the game loop:
+    s_overlap_pass_added = False
+
+    # Ray cast modes:
+    # Step samples points along the ray against the walls and hitables.
+    # Grid walks the tile map one tile at a time (walls only).
+    RAY_MODE_STEP = 'step'
+    RAY_MODE_GRID = 'grid'
+
+    # Faces of a tile a grid ray can enter through:
+    FACE_LEFT = 'left'
+    FACE_RIGHT = 'right'
+    FACE_TOP = 'top'
+    FACE_BOTTOM = 'bottom'
 
     def __init__(self, game, char_img_path, **kwargs):
         super().__init__(game, char_img_path, **kwargs)
         """ Initializer method """
-        # Send self to collision detection list:
+        # Send self to collision detection list and index:
         CollisionDetection.s_hitables.append(self)
+        CollisionDetection.s_grid.insert(self)
 
         # Set defaults
         self.set_is_collidable(True)
@@ -30,18 +53,29 @@ class CollisionDetection(CharacterClass):
         self._is_ray_hit = False
         self._is_overlap = False
         self._hit_info = {}
+        # Last object or tile this ray hit, so only it needs its flag cleared:
+        self._ray_hit_obj = None
+        self._ray_hit_tile = None
 
-        # Sends the method to the game loop
-        self.add_method_to_update_game_loop(self.methods_to_send_to_loop)
+        # One pass finds everything overlapping the player,
+        # instead of each hitable checking itself:
+        if not CollisionDetection.s_overlap_pass_added:
+            CollisionDetection.s_overlap_pass_added = True
+            self.add_method_to_update_game_loop(
+                CollisionDetection.update_player_overlaps)
 
     # Getters and setters:
     def _set_is_ray_hit(self, b: bool):
         """ Sets _is_ray_hit var  """
-        self._is_ray_hit = b
+        if self._is_ray_hit != b:
+            self._is_ray_hit = b
+            self._hit_changed()
 
     def _set_is_overlap(self, b: bool):
         """ sets _is_overlap var """
-        self._is_overlap = b
+        if self._is_overlap != b:
+            self._is_overlap = b
+            self._hit_changed()
 
     def _set_is_being_hit(self, b: bool):
         """ sets _is_being_hit Var """
@@ -72,30 +106,55 @@ class CollisionDetection(CharacterClass):
         else:
             self.set_draw_rect(False)
 
+    def _hit_changed(self):
+        """ Updates being hit when a ray hit or overlap changes """
+        self._test_hit_vars()
+        self.being_hit()
+
     def point_in_circle_cir(self, radius, angle, offset: list = [0, 0]):
         """ Math to get points along cercomfrence of a circle """
         x = (radius * math.cos(math.radians(angle))) + offset[0]
         y = (radius * math.sin(math.radians(angle))) + offset[1]
         return [x, y]
 
+    def _position_changed(self) -> None:
+        """ Moves self to the right cells of the spatial index """
+        CollisionDetection.s_grid.move(self)
+
+    def get_hitables_in_rect(self, rect: pygame.Rect) -> list:
+        """ Returns hitables overlapping the rect, excluding self """
+        return [obj for obj in CollisionDetection.s_grid.query_rect(rect)
+                if obj.id != self.id]
+
     def direction_reverse(self, directtion):
         """ Returns the opisit direction """
         output = directtion - 180
         return output
 
     # Detection methods:
-    def rect_detect(self, delta):
-        """ Detects if current object has hit the player """
-        if self.tag == CollisionDetection.TAG_PLAYER:
+    @staticmethod
+    def update_player_overlaps(delta):
+        """ Finds the hitables overlapping the player with one grid query
+            and only changes the ones that started or stopped overlapping.
+        """
+        player = CollisionDetection.s_player
+        if player is None:
             return
-
-        is_hit = self.rect.colliderect(CollisionDetection.s_player.rect)
-        if is_hit:
-            self._set_is_overlap(True)
-        else:
-            self._set_is_overlap(False)
-
-    def ray_cast_from_point(self, from_point: list, direction: int, distance: int, steps: int = 4) -> dict:  # noqa
+        hitting = {}
+        for obj in CollisionDetection.s_grid.query_rect(player.rect):
+            if obj.tag != CollisionDetection.TAG_PLAYER:
+                hitting[obj.id] = obj
+
+        last_hitting = CharacterClass.s_chars_hitting_player
+        for obj_id, obj in last_hitting.items():
+            if obj_id not in hitting:
+                obj._set_is_overlap(False)
+        for obj_id, obj in hitting.items():
+            if obj_id not in last_hitting:
+                obj._set_is_overlap(True)
+        CharacterClass.s_chars_hitting_player = hitting
+
+    def ray_cast_from_point(self, from_point: list, direction: int, distance: int, steps: int = 4, mode: str = RAY_MODE_STEP) -> dict:  # noqa
         """Ray cast method to be called by the object it's attached to:
 
         Args:
@@ -103,11 +162,23 @@ class CollisionDetection(CharacterClass):
             direction (int): The direction in angle degrees
             distance (int): how far should the ray shoot out too.
             steps (int, optional): each set the ray should check for a
-            hit. Defaults to 4.
+            hit. Defaults to 4. Not used by the grid mode.
+            mode (str, optional): RAY_MODE_STEP or RAY_MODE_GRID.
+            Defaults to RAY_MODE_STEP.
 
         Returns:
             dictionary: Information based on the hit detection.
         """
+        tracer = self.game.tracer
+        if tracer is not None:
+            trace_start = tracer.now()
+
+        if mode == CollisionDetection.RAY_MODE_GRID:
+            hit_info = self.ray_cast_grid(from_point, direction, distance)
+            if tracer is not None:
+                tracer.complete('ray_cast_grid', trace_start, None, 'ray')
+            return hit_info
+        CollisionDetection.s_rays_cast += 1
 
         # Direction placed in a variable so as to keep the line short:
         vector2D = self.point_in_circle_cir(distance, direction, from_point)
@@ -116,13 +187,15 @@ class CollisionDetection(CharacterClass):
         # Placing the max dist of the ray as the end point
         self._hit_info = self._ray_hit_info(hit_point=vector2D)
 
-        # used to skip raycast check if one has been found.
-        # But still allows the loop to complete to finish other work.
-        has_hit = False
+        # The spatial index means each step only tests
+        # the objects in the cell the point lands in,
+        # and walls are looked up in the tile map.
+        grid = CollisionDetection.s_grid
+        tile_map = CollisionDetection.s_tile_map
+        hit_obj = None
+        hit_tile = None
 
-        # Using nested while loop cause it tested faster on my PC.
         i = -1
-        j = -1
         # The loop for each step of the ray
         while i < distance - 1:
             i += steps  # The gap between each test before reaching the end.
@@ -132,57 +205,293 @@ class CollisionDetection(CharacterClass):
             x = cir_point[0]  # Sets the x
             y = cir_point[1]  # sets the y
 
-            j = -1
-            # the loop for each collidable object in the list:
-            while j < len(CollisionDetection.s_hitables) - 1:
-                j += 1
-
-                # Gets the object that is iterated in the list:
-                hit_obj = CollisionDetection.s_hitables[j]
-
+            # Walls:
+            if tile_map is not None:
+                tile = tile_map.world_to_tile(x, y)
+                if tile_map.is_solid(tile[0], tile[1]):
+                    hit_tile = tile
+                    self._hit_info = self._tile_hit_info(
+                        tile, [x, y], i, direction, from_point, None)
+                    break
+
+            # the loop for each collidable object in the cell:
+            for obj in grid.query_point(x, y):
                 # Tests if the object is it's self:
-                if hit_obj.id == self.id:
+                if obj.id == self.id:
                     continue
+                hit_obj = obj
+                break
+
+            if hit_obj is None:
+                continue
+
+            # Collects information of the hit object for use
+            self._hit_info = {
+                'has_hit': True,
+                'hit_point': [x, y],
+                'hit_object': hit_obj,
+                'hit_object_pos': hit_obj.get_position(),
+                'hit_tag': hit_obj.tag,
+                'hit_id': hit_obj.id,
+                'hit_name': hit_obj.name,
+                'hit_rect_overlap': hit_obj._get_is_overlap(),
+                'hit_has': True,
+                'hit_direction:': direction,
+                'hit_direction_oppisit': self.direction_reverse(direction),  # noqa
+                'hit_from': [from_point[0], from_point[1]],
+                'hit_distance': i,
+                'hit_face': None,
+                'hit_tile': None,
+            }
+            break
+
+        # Sets the hit by ray tag, clearing the last object hit:
+        self._update_ray_hit_obj(hit_obj)
+        self._update_ray_hit_tile(hit_tile)
+
+        if tracer is not None:
+            tracer.complete('ray_cast_step', trace_start, None, 'ray')
+        return self._hit_info
 
-                # tests if the object currently iterated to is hit:
-                if hit_obj.id == self._hit_info['hit_id']:
-                    hit_obj._set_is_ray_hit(True)
-                else:
-                    hit_obj._set_is_ray_hit(False)
+    def ray_cast_grid(self, from_point: list, direction: int, distance: int) -> dict:  # noqa
+        """Ray cast that walks the tile map one tile at a time.
 
-                # If one of the previus objects was hit,
-                # don't calc hit object again.
-                if has_hit:
-                    continue
+        Uses the Amanatides and Woo voxel traversal, so every tile the
+        ray crosses is visited exactly once and nothing thin is skipped.
+        Only the map tiles are tested, not other hitables.
+
+        Args:
+            from_point (list): location the ray is casting from.
+            direction (int): The direction in angle degrees
+            distance (int): how far should the ray shoot out too.
 
-                # Calculate hit objects
-                if pygame.Rect.collidepoint(hit_obj.rect, x, y):
-
-                    # Sets var to skip this test next iteration of loops:
-                    has_hit = True
-
-                    # Sets the hit by ray tag for the hit object
-                    hit_obj._set_is_ray_hit(True)
-
-                    # Collects information of the hit object for use
-                    self._hit_info = {
-                        'has_hit': True,
-                        'hit_point': [x, y],
-                        'hit_object': hit_obj,
-                        'hit_object_pos': hit_obj.get_position(),
-                        'hit_tag': hit_obj.tag,
-                        'hit_id': hit_obj.id,
-                        'hit_name': hit_obj.name,
-                        'hit_rect_overlap': hit_obj._get_is_overlap(),
-                        'hit_has': True,
-                        'hit_direction:': direction,
-                        'hit_direction_oppisit': self.direction_reverse(direction),  # noqa
-                        'hit_from': [from_point[0], from_point[1]],
-                        'hit_distance': i,
-                    }
+        Returns:
+            dictionary: Information based on the hit detection.
+            Also has 'hit_face' and 'hit_tile' when a tile is hit.
+        """
+        CollisionDetection.s_rays_cast += 1
+        vector2D = self.point_in_circle_cir(distance, direction, from_point)
+        self._hit_info = self._ray_hit_info(hit_point=vector2D)
 
+        tile_map = CollisionDetection.s_tile_map
+        if tile_map is None:
+            self._update_ray_hit_obj(None)
+            self._update_ray_hit_tile(None)
+            return self._hit_info
+
+        size = tile_map.get_tile_size()
+        origin = tile_map.get_map_origin()
+        # Ray start relative to the map's top left corner:
+        ox = from_point[0] - origin[0]
+        oy = from_point[1] - origin[1]
+        dx = math.cos(math.radians(direction))
+        dy = math.sin(math.radians(direction))
+
+        tile_x = math.floor(ox / size)
+        tile_y = math.floor(oy / size)
+
+        # How far along the ray until the next x and y tile edge,
+        # and how far along the ray one whole tile is:
+        if dx > 0:
+            step_x = 1
+            t_max_x = ((tile_x + 1) * size - ox) / dx
+            t_delta_x = size / dx
+        elif dx < 0:
+            step_x = -1
+            t_max_x = (tile_x * size - ox) / dx
+            t_delta_x = -size / dx
+        else:
+            step_x = 0
+            t_max_x = math.inf
+            t_delta_x = math.inf
+        if dy > 0:
+            step_y = 1
+            t_max_y = ((tile_y + 1) * size - oy) / dy
+            t_delta_y = size / dy
+        elif dy < 0:
+            step_y = -1
+            t_max_y = (tile_y * size - oy) / dy
+            t_delta_y = -size / dy
+        else:
+            step_y = 0
+            t_max_y = math.inf
+            t_delta_y = math.inf
+
+        t = 0
+        face = None
+        hit_tile = None
+        while t <= distance:
+            if tile_map.is_solid(tile_x, tile_y):
+                hit_tile = [tile_x, tile_y]
+                break
+            # Step in to which ever tile edge is closer:
+            if t_max_x < t_max_y:
+                t = t_max_x
+                t_max_x += t_delta_x
+                tile_x += step_x
+                face = self.FACE_LEFT if step_x > 0 else self.FACE_RIGHT
+            else:
+                t = t_max_y
+                t_max_y += t_delta_y
+                tile_y += step_y
+                face = self.FACE_TOP if step_y > 0 else self.FACE_BOTTOM
+
+        if hit_tile is not None:
+            hit_point = [from_point[0] + dx * t, from_point[1] + dy * t]
+            self._hit_info = self._tile_hit_info(
+                hit_tile, hit_point, t, direction, from_point, face)
+
+        # Grid casts only hit walls, so no object is hit:
+        self._update_ray_hit_obj(None)
+        self._update_ray_hit_tile(hit_tile)
         return self._hit_info
 
+    @staticmethod
+    def ray_cast_batch(origins, angles, max_distances) -> tuple:
+        """Casts many rays at once against the tile map.
+
+        The same traversal as ray_cast_grid, but every ray takes its
+        next tile step together in numpy instead of one ray per call.
+        Doesn't set any ray hit flags on the tiles,
+        so it's called on the class, no instance needed.
+
+        Args:
+            origins: (N, 2) array like of ray start points.
+            angles: (N,) array like of directions in angle degrees.
+            max_distances: (N,) array like or a single distance.
+
+        Returns:
+            tuple: (distances, points, hit_ids)
+            distances (N,) float array, max distance for misses.
+            points (N, 2) float array of the hit or end points.
+            hit_ids (N,) int array of the hit tile's index,
+            the same as TileMap.get_tile_index, -1 for misses.
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        count = len(origins)
+        CollisionDetection.s_rays_cast += count
+        radians = np.radians(np.asarray(angles, dtype=np.float64))
+        radians = np.broadcast_to(radians, (count,))
+        max_d = np.broadcast_to(
+            np.asarray(max_distances, dtype=np.float64), (count,))
+
+        dx = np.cos(radians)
+        dy = np.sin(radians)
+        # Misses report the end of the ray:
+        distances = max_d.copy()
+        hit_ids = np.full(count, -1, dtype=np.int64)
+
+        tile_map = CollisionDetection.s_tile_map
+        if tile_map is None or count == 0:
+            points = origins + np.stack((dx, dy), axis=1) * distances[:, None]
+            return distances, points, hit_ids
+
+        # The solid array may only be a window of the whole map:
+        solid = tile_map.get_solid_array()
+        size_x, size_y = solid.shape
+        size = tile_map.get_tile_size()
+        origin = tile_map.get_window_origin()
+        offset_x, offset_y = tile_map.offset
+        map_height = tile_map.get_grid_size()[1]
+        ox = origins[:, 0] - origin[0]
+        oy = origins[:, 1] - origin[1]
+
+        tile_x = np.floor(ox / size).astype(np.int64)
+        tile_y = np.floor(oy / size).astype(np.int64)
+        step_x = np.sign(dx).astype(np.int64)
+        step_y = np.sign(dy).astype(np.int64)
+
+        # Distance along each ray to the next tile edge and per tile.
+        # Rays that don't move on an axis never cross its edges:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            edge_x = np.where(step_x > 0, (tile_x + 1) * size - ox,
+                              ox - tile_x * size)
+            edge_y = np.where(step_y > 0, (tile_y + 1) * size - oy,
+                              oy - tile_y * size)
+            t_max_x = np.where(step_x != 0, edge_x / np.abs(dx), np.inf)
+            t_max_y = np.where(step_y != 0, edge_y / np.abs(dy), np.inf)
+            t_delta_x = np.where(step_x != 0, size / np.abs(dx), np.inf)
+            t_delta_y = np.where(step_y != 0, size / np.abs(dy), np.inf)
+        t = np.zeros(count)
+
+        # Only the rays still travelling are worked on each step:
+        live = np.arange(count)
+        while len(live):
+            in_map = ((tile_x >= 0) & (tile_x < size_x) &
+                      (tile_y >= 0) & (tile_y < size_y))
+            is_hit = np.zeros(len(live), dtype=bool)
+            is_hit[in_map] = solid[tile_x[in_map], tile_y[in_map]]
+            if is_hit.any():
+                hit_rays = live[is_hit]
+                distances[hit_rays] = t[is_hit]
+                hit_ids[hit_rays] = ((tile_x[is_hit] + offset_x) * map_height +
+                                     tile_y[is_hit] + offset_y)
+
+            # Step in to which ever tile edge is closer:
+            go_x = t_max_x < t_max_y
+            t = np.where(go_x, t_max_x, t_max_y)
+            tile_x = tile_x + np.where(go_x, step_x, 0)
+            tile_y = tile_y + np.where(go_x, 0, step_y)
+            t_max_x = t_max_x + np.where(go_x, t_delta_x, 0)
+            t_max_y = t_max_y + np.where(go_x, 0, t_delta_y)
+
+            keep = ~is_hit & (t <= max_d[live])
+            live = live[keep]
+            t = t[keep]
+            tile_x = tile_x[keep]
+            tile_y = tile_y[keep]
+            t_max_x = t_max_x[keep]
+            t_max_y = t_max_y[keep]
+            t_delta_x = t_delta_x[keep]
+            t_delta_y = t_delta_y[keep]
+            step_x = step_x[keep]
+            step_y = step_y[keep]
+
+        points = origins + np.stack((dx, dy), axis=1) * distances[:, None]
+        return distances, points, hit_ids
+
+    def _update_ray_hit_obj(self, hit_obj) -> None:
+        """ Moves the ray hit flag from the last hit object to the new one """
+        if self._ray_hit_obj is not None and self._ray_hit_obj is not hit_obj:
+            self._ray_hit_obj._set_is_ray_hit(False)
+        if hit_obj is not None:
+            hit_obj._set_is_ray_hit(True)
+        self._ray_hit_obj = hit_obj
+
+    def _update_ray_hit_tile(self, hit_tile) -> None:
+        """ Moves the ray hit flag from the last hit tile to the new one """
+        tile_map = CollisionDetection.s_tile_map
+        tile_index = None
+        if hit_tile is not None:
+            tile_index = tile_map.get_tile_index(hit_tile[0], hit_tile[1])
+        if self._ray_hit_tile is not None and self._ray_hit_tile != tile_index:  # noqa
+            tile_map.set_tile_ray_hit(self._ray_hit_tile, False)
+        if tile_index is not None:
+            tile_map.set_tile_ray_hit(tile_index, True)
+        self._ray_hit_tile = tile_index
+
+    # Method for setting up the ray hit information of a wall tile:
+    def _tile_hit_info(self, hit_tile, hit_point, distance, direction, from_point, face):  # noqa
+        """ Hit information for a wall tile, which has no object """
+        tile_map = CollisionDetection.s_tile_map
+        return {
+            'has_hit': True,
+            'hit_point': hit_point,
+            'hit_object': None,
+            'hit_object_pos': tile_map.tile_to_world(hit_tile[0], hit_tile[1]),
+            'hit_tag': CollisionDetection.TAG_WORLD,
+            'hit_id': tile_map.get_tile_index(hit_tile[0], hit_tile[1]),
+            'hit_name': 'wall',
+            'hit_rect_overlap': False,
+            'hit_has': True,
+            'hit_direction:': direction,
+            'hit_direction_oppisit': self.direction_reverse(direction),
+            'hit_from': [from_point[0], from_point[1]],
+            'hit_distance': distance,
+            'hit_face': face,
+            'hit_tile': hit_tile,
+        }
+
     # Method for setting up the ray hit information:
     def _ray_hit_info(self, **kwargs):
         defaults = {
@@ -199,13 +508,8 @@ class CollisionDetection(CharacterClass):
             'hit_direction_oppisit': None,  # noqa
             'hit_from': None,
             'hit_distance': None,
+            'hit_face': None,
+            'hit_tile': None,
         }
         defaults.update(kwargs)
         return defaults.copy()
-
-    # Method to hold all looped methods to be sent to game loop update
-    def methods_to_send_to_loop(self, delta):
-        """ All methods to add to loop to be called """
-        self._test_hit_vars()
-        self.being_hit()
-        self.rect_detect(delta)
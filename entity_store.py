@@ -0,0 +1,232 @@
+"""
+Entity Store
+
+Keeps the position, velocity, speed and flags of every character
+in NumPy arrays, one row per character, so a sim step moves
+them all with a few array operations instead of
+each character doing its own math in Python lists.
+
+Characters hold their row (slot) and read and write through it.
+Only the characters whose whole pixel position changed
+have their rect and spatial index updated in Python.
+"""
+
+# Imports:
+import numpy as np
+
+
+class EntityStore:
+    """ Struct of arrays for every character's movement """
+
+    DEFAULT_CAPACITY = 64
+
+    # Flags:
+    # The slot has a character in it.
+    FLAG_ACTIVE = 1
+    # The character is moved by its velocity.
+    FLAG_MOVABLE = 2
+    # Both, the characters the sim step moves:
+    FLAGS_MOVING = FLAG_ACTIVE | FLAG_MOVABLE
+    # The character is asleep, not moved until it's woken:
+    FLAG_SLEEPING = 4
+
+    def __init__(self, game=None, capacity: int = DEFAULT_CAPACITY):
+        """ Class initilizer. Adds the sim step to the game loop.
+
+        Args:
+            game (GameBase): The game to add the sim step to.
+            capacity (int): Rows to start with, it grows as needed.
+        """
+        self.capacity = max(1, capacity)
+        # Rows in use, freed rows under this are reused first:
+        self.count = 0
+        self.free_slots = []
+
+        self.position = np.zeros((self.capacity, 2))
+        # Position at the start of the sim step, drawn between the two:
+        self.prev_position = np.zeros((self.capacity, 2))
+        self.velocity = np.zeros((self.capacity, 2))
+        self.speed = np.zeros(self.capacity)
+        self.flags = np.zeros(self.capacity, dtype=np.uint8)
+        # The whole pixel rect position, rounded the way pygame does:
+        self.rect_position = np.zeros((self.capacity, 2), dtype=np.int64)
+        # The character in each row:
+        self.entities = [None] * self.capacity
+
+        # Draw positions of the frame being drawn, as Python lists:
+        self.draw_positions = []
+        self._draw_key = None
+        # How many rects were moved last sim step:
+        self.rects_moved = 0
+
+        if game is not None:
+            game.add_to_update_early_functions(self.early_update)
+            game.add_to_update_functions(self.update)
+
+    def __len__(self):
+        return self.count - len(self.free_slots)
+
+    # =============================
+    # ---  Add and Remove  --------
+    # =============================
+
+    def add(self, entity, position, speed, flags: int = FLAGS_MOVING):
+        """ Gives an entity a row. Returns the row's slot """
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.count == self.capacity:
+                self._grow()
+            slot = self.count
+            self.count += 1
+        self.entities[slot] = entity
+        self.position[slot] = position
+        self.prev_position[slot] = position
+        self.velocity[slot] = 0
+        self.speed[slot] = speed
+        self.flags[slot] = flags | self.FLAG_ACTIVE
+        self.rect_position[slot] = self.round_positions(
+            self.position[slot])
+        return slot
+
+    def remove(self, slot: int) -> None:
+        """ Frees an entity's row for the next one """
+        if not self.flags[slot] & self.FLAG_ACTIVE:
+            return
+        self.flags[slot] = 0
+        self.velocity[slot] = 0
+        self.entities[slot] = None
+        self.free_slots.append(slot)
+
+    def _grow(self) -> None:
+        """ Doubles the rows, slots stay the same """
+        old = self.capacity
+        self.capacity = old * 2
+        for name in ('position', 'prev_position', 'velocity',
+                     'speed', 'flags', 'rect_position'):
+            array = getattr(self, name)
+            grown = np.zeros((self.capacity,) + array.shape[1:],
+                             dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self.entities.extend([None] * old)
+
+    # =============================
+    # --- Setters and Getters : ---
+    # =============================
+
+    def set_position(self, slot: int, position) -> None:
+        """ Jumps a row to a position, without sliding between steps """
+        self.position[slot] = position
+        self.prev_position[slot] = position
+        self.rect_position[slot] = self.round_positions(
+            self.position[slot])
+
+    def get_position(self, slot: int) -> list:
+        """ Returns a row's position as a list """
+        return self.position[slot].tolist()
+
+    def set_velocity(self, slot: int, velocity) -> None:
+        """ Sets a row's move direction """
+        self.velocity[slot] = velocity
+
+    def set_speed(self, slot: int, speed) -> None:
+        """ Sets a row's speed """
+        self.speed[slot] = speed
+
+    def set_flag(self, slot: int, flag: int, b: bool) -> None:
+        """ Turns a flag on or off for a row """
+        if b:
+            self.flags[slot] |= flag
+        else:
+            self.flags[slot] &= ~np.uint8(flag)
+
+    def get_rect_position(self, slot: int) -> tuple:
+        """ Returns a row's whole pixel rect position """
+        x, y = self.rect_position[slot].tolist()
+        return x, y
+
+    @staticmethod
+    def round_positions(positions: np.ndarray) -> np.ndarray:
+        """ Rounds to whole pixels, halves away from 0 like pygame.Rect """
+        whole = np.trunc(positions)
+        half_up = np.abs(positions - whole) >= 0.5
+        return (whole + half_up * np.sign(positions)).astype(np.int64)
+
+    # =============================
+    # ---  Drawing  ---------------
+    # =============================
+
+    def get_draw_positions(self, alpha: float, offset, frame) -> list:
+        """ Returns every row's display position between the
+            last two sim steps, worked out once per frame.
+        """
+        key = (frame, alpha, offset[0], offset[1])
+        if key != self._draw_key:
+            self._draw_key = key
+            count = self.count
+            prev = self.prev_position[:count]
+            pos = prev + (self.position[:count] - prev) * alpha
+            # Floored so the sprites and map move together:
+            pos = np.floor(pos).astype(np.int64)
+            pos -= np.array(offset, dtype=np.int64)
+            self.draw_positions = pos.tolist()
+        return self.draw_positions
+
+    def get_render_position(self, slot: int, alpha: float) -> list:
+        """ Returns a row's position between the last two sim steps """
+        px, py = self.prev_position[slot].tolist()
+        x, y = self.position[slot].tolist()
+        return [px + (x - px) * alpha, py + (y - py) * alpha]
+
+    # =============================
+    # ---  Update loop  -----------
+    # =============================
+
+    def early_update(self, delta) -> None:
+        """ Keeps every position from before this sim step """
+        count = self.count
+        self.prev_position[:count] = self.position[:count]
+
+    def update(self, delta) -> None:
+        """ Moves every movable row by its velocity and speed,
+            then updates the rects that moved a whole pixel.
+        """
+        count = self.count
+        velocity = self.velocity[:count]
+        flags = self.flags[:count] & (self.FLAGS_MOVING | self.FLAG_SLEEPING)
+        moving = np.flatnonzero(
+            (flags == self.FLAGS_MOVING) & velocity.any(axis=1))
+        if not len(moving):
+            self.rects_moved = 0
+            return
+        self.position[moving] += \
+            velocity[moving] * self.speed[moving, None] * delta
+        self.sync_rects(moving)
+
+    def sync_rects(self, slots: np.ndarray) -> None:
+        """ Moves the rects of the rows that changed whole pixels
+            and lets their entities know.
+        """
+        rounded = self.round_positions(self.position[slots])
+        changed = (rounded != self.rect_position[slots]).any(axis=1)
+        slots = slots[changed]
+        rounded = rounded[changed]
+        self.rect_position[slots] = rounded
+        self.rects_moved = len(slots)
+
+        entities = self.entities
+        for slot, position in zip(slots.tolist(), rounded.tolist()):
+            entity = entities[slot]
+            entity.rect.topleft = position
+            entity._position_changed()
+
+    def get_stats(self) -> dict:
+        """ Returns how many rows are used, asleep and moved """
+        sleeping = self.flags[:self.count] & self.FLAG_SLEEPING
+        return {
+            'entities': len(self),
+            'sleeping': int(np.count_nonzero(sleeping)),
+            'capacity': self.capacity,
+            'rects_moved': self.rects_moved,
+        }
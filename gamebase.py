@@ -1,10 +1,16 @@
 """
     Base Class for the game loop and window creation.
 """
+import os
 import pygame
 import sys
+import time
 
 from typing import Callable
+from camera import Camera
+from profiler import (
+    CallbackSampler, FrameProfiler, NullPhaseTimer, PhaseTimer)
+from tracing import TraceWriter
 
 
 class GameBase:
@@ -22,6 +28,29 @@ class GameBase:
     update_late_functions = []
     # list of functions to be called early.
     update_early_functions = []
+    # List of functions called once a frame after the events are read,
+    # with the frame's time even with fixed steps.
+    input_functions = []
+    # Where the events come from, swapped out to replay input:
+    event_pump: Callable = pygame.event.get
+    # List of functions that draw, called once per frame with
+    # how far between the last two sim steps to draw at.
+    render_functions = []
+    # Functions taken out of their lists at the start of the next frame,
+    # so a list isn't changed while it's being called.
+    # id(list) -> (list, functions to take out)
+    pending_removals = {}
+
+    # Render queue layers, drawn bottom to top:
+    LAYER_WORLD = 0
+    LAYER_ENTITIES = 1
+    LAYER_PLAYER = 2
+    LAYER_UI = 3
+    # Per layer (surface, position) pairs, drawn with one blits call,
+    # then per layer draw functions for lines, rects and the like.
+    # Filled by the render functions and emptied each frame.
+    render_blits = [[], [], [], []]
+    render_draws = [[], [], [], []]
 
     # static propertie for the window
     window = None
@@ -30,19 +59,91 @@ class GameBase:
     window_title = None
     window_size = None
     bg_color = (120, 120, 120)
+    # Frame rate cap, 0 for uncapped:
+    max_fps = 120
+
+    # Fixed step simulation. When off the sim takes one step
+    # per frame with the frame's delta.
+    fixed_step = False
+    # Sim steps per second:
+    tick_rate = 60
+    # Most sim steps in a frame before the sim falls behind
+    # instead of trying to catch up:
+    max_steps = 5
+    # Frame time not yet simulated, in seconds:
+    accumulator = 0.0
+    # Frame time thrown away because of max_steps, in seconds:
+    dropped_time = 0.0
+
+    # Dirty rect rendering. Only the parts of the display
+    # that changed are redrawn and sent to the window.
+    dirty_rect_mode = False
+    # Functions called with alpha before drawing that report
+    # what they will draw with add_dirty_rect or request_full_redraw:
+    dirty_rect_functions = []
+    # Display rects to redraw this frame:
+    dirty_rects = []
+    # Set to redraw everything next frame:
+    full_redraw = True
+    # More rects or area than this and the whole display is redrawn:
+    MAX_DIRTY_RECTS = 24
+    MAX_DIRTY_AREA = 0.5
+    # Frames drawn, so things worked out once a frame
+    # can tell if it's a new frame:
+    frame_count = 0
+    # Frames drawn in full or in parts while in dirty rect mode:
+    full_redraw_count = 0
+    dirty_redraw_count = 0
+    # Per phase frame timings, None when not profiling:
+    profiler: FrameProfiler = None
+    # Per callback timings, None when not sampling:
+    callback_sampler: CallbackSampler = None
+    # Trace file being written, None when not tracing:
+    tracer: TraceWriter = None
+    # Times each phase for the profiler and tracer,
+    # does nothing if neither is on:
+    phase_timer = NullPhaseTimer()
+
+    # Loaded images shared by every object, keyed by path:
+    image_cache = {}
+    image_cache_hits = 0
+    image_cache_misses = 0
+    # Times an image was read from disk and converted to the display:
+    image_decodes = 0
+    image_conversions = 0
+
+    # How the display gets on to the window, picked in create_window:
+    # The display is the window, nothing to scale.
+    PRESENT_DIRECT = 'direct'
+    # The window is a whole number times the display size,
+    # the display is scaled straight in to the window.
+    PRESENT_INTEGER = 'integer'
+    # Scaled in to surf, made once, then blitted to the window.
+    PRESENT_SCALED = 'scaled'
+    present_mode = None
+    # Surfaces made while presenting, should stay 0:
+    present_allocations = 0
+
+    # Follows the camera target, made with the window:
+    camera: Camera = None
 
     def __init__(
             self,
             window_width: int = 400,
             window_height: int = 400,
-            window_title: str = "Default Title"
+            window_title: str = "Default Title",
+            screen_scale: int = 2
     ):
         """ Init for the class. Calls window creation method """
-        self.create_window(window_width, window_height, window_title)
+        self.create_window(
+            window_width, window_height, window_title, screen_scale)
 
     def create_window(
-            self, window_width, window_height, window_title):
-        """ Creates the game window if none exists."""
+            self, window_width, window_height, window_title,
+            screen_scale: int = 2):
+        """ Creates the game window if none exists.
+            The game is drawn at 1 / screen_scale of the window size.
+        """
         if GameBase.window:
             return
             # sets up values:
@@ -57,13 +158,35 @@ class GameBase:
         # sets window title:
         pygame.display.set_caption(self.window_title)
         # Creates window:
-        self.s_s_size = 2  # Screen Scale Size
-        self.display = pygame.Surface((GameBase.window_width/self.s_s_size, GameBase.window_height/self.s_s_size))  # noqa
+        GameBase.window = pygame.display.set_mode(GameBase.window_size, 0, 32)
+        self.s_s_size = screen_scale  # Screen Scale Size
+        self.surf = None
+        if self.s_s_size == 1:
+            # Draws straight on to the window:
+            self.display = GameBase.window
+            GameBase.present_mode = GameBase.PRESENT_DIRECT
+        else:
+            # Same pixel format as the window so it can be scaled
+            # straight in to it:
+            self.display = pygame.Surface((GameBase.window_width/self.s_s_size, GameBase.window_height/self.s_s_size), 0, GameBase.window)  # noqa
+            display_w, display_h = self.display.get_size()
+            if (display_w * self.s_s_size == window_width and
+                    display_h * self.s_s_size == window_height):
+                GameBase.present_mode = GameBase.PRESENT_INTEGER
+            else:
+                GameBase.present_mode = GameBase.PRESENT_SCALED
+                # Made once and scaled in to each frame:
+                self.surf = pygame.Surface(
+                    GameBase.window_size, 0, GameBase.window)
         self.dis_cent_x = self.display.get_width() / 2
         self.dis_cent_y = self.display.get_height() / 2
         self.dis_center = [self.dis_cent_x, self.dis_cent_y]
-        self.surf = pygame.transform.scale(self.display, GameBase.window_size)
-        GameBase.window = pygame.display.set_mode(GameBase.window_size, 0, 32)
+
+        # Moves after everything else each sim step:
+        GameBase.camera = Camera(self, self.display.get_size())
+        self.add_to_update_early_functions(self.camera.early_update)
+        self.add_to_update_late_functions(self.camera.update)
+        self.add_to_dirty_rect_functions(self.camera.report_dirty_rect)
 
     def check_if_window_close_pressed(self, event) -> None:
         """ Checks if window close button was pressed """
@@ -118,6 +241,11 @@ class GameBase:
         for f in GameBase.update_event_functions:
             f(delta, event)
 
+    # Adds methods or functions to input list
+    def add_to_input_functions(self, funct: Callable):
+        """ Adds new functions to the list of input list """
+        GameBase.input_functions.append(funct)
+
     # Adds methods or functions to late update list
     def add_to_update_late_functions(self, funct: Callable):
         """ Adds functions to late update list"""
@@ -129,6 +257,103 @@ class GameBase:
         for f in GameBase.update_late_functions:
             f(delta)
 
+    # Adds methods or functions to the render list
+    def add_to_render_functions(self, funct: Callable):
+        """ Adds functions that draw to the render list.
+            They're called with alpha, 0 to 1, how far from the
+            last sim step to the current one to draw things at,
+            and add what they draw to the render queue.
+        """
+        # Still in the list if it was waiting to be taken out:
+        if self.cancel_removal(GameBase.render_functions, funct):
+            return
+        GameBase.render_functions.append(funct)
+
+    def remove_from_render_functions(self, funct: Callable):
+        """ Takes a function out of the render list next frame """
+        self.remove_function(GameBase.render_functions, funct)
+
+    # Calls methods or functions in the render list
+    def render_loop(self, alpha):
+        """ Calls each function in the render list """
+        for f in GameBase.render_functions:
+            f(alpha)
+
+    # Render queue:
+    def queue_blit(self, surf, position, layer: int = LAYER_ENTITIES):
+        """ Adds an image to be drawn on a layer this frame """
+        GameBase.render_blits[layer].append((surf, position))
+
+    def queue_draw(self, funct: Callable, layer: int = LAYER_ENTITIES):
+        """ Adds a function to be called on a layer this frame,
+            after the layer's images are drawn
+        """
+        GameBase.render_draws[layer].append(funct)
+
+    def flush_render_queue(self, clear: bool = True):
+        """ Draws the render queue, a layer at a time.
+            Empties it unless clear is False, to draw it again.
+        """
+        display = self.display
+        for blits, draws in zip(GameBase.render_blits, GameBase.render_draws):
+            if blits:
+                display.blits(blits, doreturn=False)
+            for f in draws:
+                f()
+        if clear:
+            self.clear_render_queue()
+
+    def clear_render_queue(self):
+        """ Empties the render queue """
+        for blits, draws in zip(GameBase.render_blits, GameBase.render_draws):
+            blits.clear()
+            draws.clear()
+
+    # Adds methods or functions to the dirty rect list
+    def add_to_dirty_rect_functions(self, funct: Callable):
+        """ Adds functions that report what changed on the display.
+            Called with alpha before drawing in dirty rect mode.
+        """
+        # Still in the list if it was waiting to be taken out:
+        if self.cancel_removal(GameBase.dirty_rect_functions, funct):
+            return
+        GameBase.dirty_rect_functions.append(funct)
+
+    def remove_from_dirty_rect_functions(self, funct: Callable):
+        """ Takes a function out of the dirty rect list next frame """
+        self.remove_function(GameBase.dirty_rect_functions, funct)
+
+    # Removes methods or functions from any of the lists
+    def remove_function(self, functions: list, funct: Callable):
+        """ Takes a function out of a list at the start of next frame.
+            Many are taken out in one pass over the list, instead of
+            one pass each. Adding it back to the render or dirty rect
+            list before then keeps it in.
+        """
+        key = id(functions)
+        pending = GameBase.pending_removals.get(key)
+        if pending is None:
+            pending = GameBase.pending_removals[key] = (functions, [])
+        pending[1].append(funct)
+
+    def cancel_removal(self, functions: list, funct: Callable) -> bool:
+        """ Keeps a function waiting to be taken out in its list.
+            Returns False if it wasn't waiting.
+        """
+        pending = GameBase.pending_removals.get(id(functions))
+        if pending is None or funct not in pending[1]:
+            return False
+        pending[1].remove(funct)
+        return True
+
+    def apply_removals(self):
+        """ Takes out every function waiting to be removed """
+        for functions, removing in GameBase.pending_removals.values():
+            if removing:
+                removing = set(removing)
+                functions[:] = [f for f in functions if f not in removing]
+        GameBase.pending_removals.clear()
+
     # Adds methods or functiosn to early update list
     def add_to_update_early_functions(self, funct: Callable):
         """ Adds functions to early update list"""
@@ -141,15 +366,392 @@ class GameBase:
             f(delta)
 
     # Method used to load images in to game.
-    def load_image(self, path: str):
-        """ Loads image in to pygame """
-        return pygame.image.load(path)
+    def load_image(self, path: str, convert: bool = True):
+        """ Loads image in to pygame.
+            Each path is only loaded from disk once and then shared,
+            so don't draw on the returned surface.
+            If convert is True and the window exists, the image is
+            converted to the display's pixel format for faster blits.
+        """
+        key = (os.path.normpath(path), convert)
+        img = GameBase.image_cache.get(key)
+        if img is not None:
+            GameBase.image_cache_hits += 1
+            return img
+
+        GameBase.image_cache_misses += 1
+        raw_key = (key[0], False)
+        if not convert or pygame.display.get_surface() is None:
+            # Before the window exists it can't be converted, so it's
+            # kept as unconverted and converted on a call after:
+            img = GameBase.image_cache.get(raw_key)
+            if img is None:
+                img = GameBase.image_cache[raw_key] = pygame.image.load(path)
+                GameBase.image_decodes += 1
+            return img
+
+        # Loaded before the window, no need to read it again:
+        img = GameBase.image_cache.get(raw_key)
+        if img is None:
+            img = pygame.image.load(path)
+            GameBase.image_decodes += 1
+        # Keep the alpha of images that have it:
+        if img.get_flags() & pygame.SRCALPHA:
+            img = img.convert_alpha()
+        else:
+            img = img.convert()
+        GameBase.image_conversions += 1
+        GameBase.image_cache[key] = img
+        return img
+
+    def evict_image(self, path: str) -> None:
+        """ Removes an image from the image cache """
+        path = os.path.normpath(path)
+        for key in [k for k in GameBase.image_cache if k[0] == path]:
+            del GameBase.image_cache[key]
+
+    def clear_image_cache(self) -> None:
+        """ Empties the image cache and resets its counters """
+        GameBase.image_cache.clear()
+        GameBase.image_cache_hits = 0
+        GameBase.image_cache_misses = 0
+        GameBase.image_decodes = 0
+        GameBase.image_conversions = 0
+
+    def get_image_cache_stats(self) -> dict:
+        """ Returns the image cache hits, misses, disk decodes,
+            display conversions and size
+        """
+        return {
+            'hits': GameBase.image_cache_hits,
+            'misses': GameBase.image_cache_misses,
+            'decodes': GameBase.image_decodes,
+            'conversions': GameBase.image_conversions,
+            'size': len(GameBase.image_cache),
+        }
 
     # Returns the displayed unscaled center point:
     def get_screen_center(self) -> list:
         """ Returns the game display center point """
         return self.dis_center
 
+    # Fixed step controls:
+    def set_fixed_step(self, tick_rate: int = 60, max_steps: int = 5):
+        """ Runs the sim at a fixed tick_rate steps per second,
+            no matter the frame rate. Drawing is interpolated
+            between the last two steps.
+        """
+        GameBase.fixed_step = True
+        GameBase.tick_rate = tick_rate
+        GameBase.max_steps = max_steps
+        GameBase.accumulator = 0.0
+
+    def set_variable_step(self):
+        """ Runs one sim step per frame with the frame's delta """
+        GameBase.fixed_step = False
+        GameBase.accumulator = 0.0
+
+    def take_fixed_steps(self, frame_time) -> int:
+        """ Adds the frame time to the accumulator and
+            returns how many fixed steps to run.
+        """
+        step = 1 / self.tick_rate
+        accumulator = GameBase.accumulator + frame_time
+        steps = int(accumulator * self.tick_rate)
+        if steps > self.max_steps:
+            # Too far behind, drop the rest instead of spiralling:
+            dropped = (steps - self.max_steps) * step
+            GameBase.dropped_time += dropped
+            accumulator -= dropped
+            steps = self.max_steps
+        GameBase.accumulator = accumulator - steps * step
+        return steps
+
+    def get_alpha(self) -> float:
+        """ Returns how far between the last two fixed steps
+            the current frame is, 0 to 1.
+        """
+        if not self.fixed_step:
+            return 1.0
+        return min(GameBase.accumulator * self.tick_rate, 1.0)
+
+    # One pass of the game loop
+    def run_frame(self, delta):
+        """ Runs every phase of a single frame.
+            With fixed_step on delta is the frame time and
+            the sim runs as many fixed steps as it covers.
+            The phase timer and callback sampler are used if they're on.
+        """
+        # Functions taken out last frame:
+        if GameBase.pending_removals:
+            self.apply_removals()
+
+        timer = GameBase.phase_timer
+        timer.begin_frame()
+        # Times each callback on the frames the sampler picks:
+        call = self._call_functions
+        sampler = GameBase.callback_sampler
+        if sampler is not None and sampler.begin_frame():
+            call = sampler.call
+
+        frame_time = delta
+        fixed = self.fixed_step
+        if fixed:
+            delta = 1 / self.tick_rate
+        else:
+            # Early runs before the events without fixed steps:
+            call(GameBase.update_early_functions, delta)
+            timer.mark(FrameProfiler.PHASE_EARLY)
+
+        # Events are read once a frame, before the steps:
+        for event in GameBase.event_pump():
+            self.check_if_window_close_pressed(event)
+            call(GameBase.update_event_functions, delta, event)
+        call(GameBase.input_functions, frame_time)
+        timer.mark(FrameProfiler.PHASE_EVENTS)
+
+        # Update phase, once or as many fixed steps as the frame covers:
+        steps = self.take_fixed_steps(frame_time) if fixed else 1
+        for _ in range(steps):
+            if fixed:
+                call(GameBase.update_early_functions, delta)
+                timer.mark(FrameProfiler.PHASE_EARLY)
+            call(GameBase.update_functions, delta)
+            timer.mark(FrameProfiler.PHASE_UPDATE)
+            call(GameBase.update_late_functions, delta)
+            timer.mark(FrameProfiler.PHASE_LATE)
+
+        # Draw the frame to the window:
+        rects = self.draw_frame(self.get_alpha(), call)
+        timer.mark(FrameProfiler.PHASE_RENDER)
+        self.present(rects)
+        timer.mark(FrameProfiler.PHASE_PRESENT)
+        timer.end_frame()
+
+    def draw_frame(self, alpha, call: Callable = None):
+        """ Draws everything, or in dirty rect mode only what changed.
+            Returns the display rects drawn, or None for all of it.
+        """
+        if call is None:
+            call = self._call_functions
+        GameBase.frame_count += 1
+        display = self.display
+        # Where the view is this frame, worked out once for everything:
+        self.camera.begin_frame(alpha)
+
+        if self.dirty_rect_mode:
+            rects = self.collect_dirty_rects(alpha)
+            if rects is not None:
+                # The render functions fill the queue once,
+                # then it's drawn clipped to each rect:
+                call(GameBase.render_functions, alpha)
+                for rect in rects:
+                    display.set_clip(rect)
+                    display.fill(self.bg_color, rect)
+                    self.flush_render_queue(clear=False)
+                display.set_clip(None)
+                self.clear_render_queue()
+                GameBase.dirty_redraw_count += 1
+                return rects
+            GameBase.full_redraw_count += 1
+
+        # Clear Screen: AKA, Override screen with single color:
+        display.fill(self.bg_color)
+        call(GameBase.render_functions, alpha)
+        self.flush_render_queue()
+        return None
+
+    # Dirty rect controls:
+    def set_dirty_rect_mode(self, b: bool):
+        """ Turns dirty rect rendering on or off """
+        GameBase.dirty_rect_mode = b
+        GameBase.full_redraw = True
+
+    def add_dirty_rect(self, rect: pygame.Rect):
+        """ Marks a part of the display to be redrawn this frame """
+        GameBase.dirty_rects.append(rect)
+
+    def request_full_redraw(self):
+        """ Redraws the whole display this frame """
+        GameBase.full_redraw = True
+
+    def collect_dirty_rects(self, alpha) -> list:
+        """ Asks everything what changed and returns the merged
+            rects to redraw, or None to redraw everything.
+        """
+        GameBase.dirty_rects = []
+        for f in GameBase.dirty_rect_functions:
+            f(alpha)
+        if GameBase.full_redraw:
+            GameBase.full_redraw = False
+            return None
+
+        display_rect = self.display.get_rect()
+        rects = []
+        for rect in self.merge_rects(GameBase.dirty_rects):
+            rect = rect.clip(display_rect)
+            if rect.w and rect.h:
+                rects.append(rect)
+        if len(rects) > self.MAX_DIRTY_RECTS:
+            return None
+        area = sum(rect.w * rect.h for rect in rects)
+        if area > display_rect.w * display_rect.h * self.MAX_DIRTY_AREA:
+            return None
+        return rects
+
+    @staticmethod
+    def merge_rects(rects: list) -> list:
+        """ Joins overlapping rects in to one """
+        merged = []
+        for rect in rects:
+            rect = pygame.Rect(rect)
+            i = rect.collidelist(merged)
+            while i != -1:
+                rect.union_ip(merged.pop(i))
+                i = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    @staticmethod
+    def _call_functions(functions: list, *args):
+        """ Calls each function in a list with args """
+        for f in functions:
+            f(*args)
+
+    # Profiler controls:
+    def enable_profiler(self, size: int = FrameProfiler.DEFAULT_SIZE):
+        """ Starts timing each phase of the game loop.
+            Keeps the last 'size' frames.
+        """
+        GameBase.profiler = FrameProfiler(size)
+        self._update_phase_timer()
+
+    def disable_profiler(self):
+        """ Stops timing the game loop phases """
+        GameBase.profiler = None
+        self._update_phase_timer()
+
+    def get_phase_stats(self, frames: int = None) -> dict:
+        """ Returns the average and percentiles of each phase in ms
+            over the last 'frames' frames, or all that are kept.
+        """
+        if self.profiler is None:
+            return {}
+        return self.profiler.get_stats(frames)
+
+    def enable_callback_sampler(
+            self,
+            every: int = CallbackSampler.DEFAULT_EVERY,
+            window: int = CallbackSampler.DEFAULT_WINDOW
+    ):
+        """ Starts timing each callback one frame out of 'every',
+            keeping the last 'window' sampled frames.
+        """
+        GameBase.callback_sampler = CallbackSampler(every, window)
+        self._update_phase_timer()
+
+    def disable_callback_sampler(self):
+        """ Stops timing each callback """
+        GameBase.callback_sampler = None
+        self._update_phase_timer()
+
+    def get_top_callbacks(self, count: int = 10) -> list:
+        """ Returns the most expensive callback owners,
+            grouped by class and tag.
+        """
+        if self.callback_sampler is None:
+            return []
+        return self.callback_sampler.get_top(count)
+
+    @classmethod
+    def start_trace(
+            cls,
+            path: str,
+            max_queued: int = TraceWriter.DEFAULT_MAX_QUEUED
+    ):
+        """ Starts writing a Chrome trace of each frame to path.
+            Stops any trace already running. A class method so it can
+            be started before the game and map are made.
+        """
+        cls.stop_trace()
+        GameBase.tracer = TraceWriter(path, max_queued)
+        cls._update_phase_timer()
+
+    @classmethod
+    def stop_trace(cls) -> dict:
+        """ Finishes the trace file. Returns how many spans were
+            written and dropped, or {} if no trace was running.
+        """
+        tracer = GameBase.tracer
+        if tracer is None:
+            return {}
+        GameBase.tracer = None
+        cls._update_phase_timer()
+        return tracer.close()
+
+    @staticmethod
+    def _update_phase_timer():
+        """ Picks the phase timer for the profiler and tracer """
+        if GameBase.profiler is None and GameBase.tracer is None:
+            GameBase.phase_timer = NullPhaseTimer()
+        else:
+            GameBase.phase_timer = PhaseTimer(
+                GameBase.profiler, GameBase.tracer)
+
+    # Puts the finished frame on the window
+    def present(self, rects: list = None):
+        """ Scales the display to the window and updates it.
+            With rects only those parts of the display are sent.
+        """
+        if rects is not None:
+            self.present_rects(rects)
+            return
+
+        # Scale the game screen to fit the window,
+        # in to surfaces that already exist:
+        mode = self.present_mode
+        if mode == GameBase.PRESENT_INTEGER:
+            pygame.transform.scale(
+                self.display, GameBase.window_size, GameBase.window)
+        elif mode == GameBase.PRESENT_SCALED:
+            pygame.transform.scale(
+                self.display, GameBase.window_size, self.surf)
+            # Draw the scaled game to the window:
+            GameBase.window.blit(self.surf, (0, 0))
+        # Updates every thing in the display
+        pygame.display.update()
+
+    def present_rects(self, rects: list):
+        """ Scales parts of the display to the window and updates
+            only those parts of the window.
+        """
+        if not rects:
+            return
+        mode = self.present_mode
+        if mode == GameBase.PRESENT_DIRECT:
+            pygame.display.update(rects)
+            return
+
+        scale_x = GameBase.window_width / self.display.get_width()
+        scale_y = GameBase.window_height / self.display.get_height()
+        window = GameBase.window
+        window_rects = []
+        for rect in rects:
+            window_rect = pygame.Rect(
+                round(rect.x * scale_x), round(rect.y * scale_y),
+                round(rect.w * scale_x), round(rect.h * scale_y))
+            if mode == GameBase.PRESENT_INTEGER:
+                pygame.transform.scale(
+                    self.display.subsurface(rect), window_rect.size,
+                    window.subsurface(window_rect))
+            else:
+                window.blit(pygame.transform.scale(
+                    self.display.subsurface(rect), window_rect.size),
+                    window_rect)
+                GameBase.present_allocations += 1
+            window_rects.append(window_rect)
+        pygame.display.update(window_rects)
+
     # The main game loop
     def main_game_loop(self):
         """ Main game loop. """
@@ -158,44 +760,19 @@ class GameBase:
         self.call_ready()
 
         # initial tick time
-        getTicksLastFrame = 1
+        last_frame_time = time.perf_counter()
 
         # Main loop
         while True:
-            # Clear Screen: AKA, Override screen with single color:
-            self.display.fill(self.bg_color)
-
-            # Delta time:
-            t = pygame.time.get_ticks()
-            # deltaTime in seconds.
-            delta = (t - getTicksLastFrame) / 1000.0
-            getTicksLastFrame = t
+            # Delta time in seconds:
+            t = time.perf_counter()
+            delta = t - last_frame_time
+            last_frame_time = t
 
-            # Update phase:
-            # Call Early Update method
-            self.update_early_loop(delta)
-
-            # Event loop to call Update loops needing events
-            for event in pygame.event.get():
-                self.check_if_window_close_pressed(event)
-                self.update_event_loop(delta, event)
-
-            # Standard update to be called:
-            self.update_loop(delta)
-
-            # Late update
-            self.update_late_loop(delta)
-
-            # Scale the game screen to fit the window:
-            self.surf = pygame.transform.scale(
-                self.display, GameBase.window_size)
-            # Draw the scaled game to the window:
-            GameBase.window.blit(self.surf, (0, 0))
-            # Updates every thing in the display
-            pygame.display.update()
+            self.run_frame(delta)
 
             # print(self.clock.get_fps()) # Uncomment to show FPS in console.
-            self.clock.tick(120)  # Max FPS # Probably shouldn't be hard coded.
+            self.clock.tick(self.max_fps)  # Max FPS, 0 is uncapped.
 
     # Initiates the game system
     def start_main(self):
@@ -0,0 +1,247 @@
+"""
+Performance HUD
+
+Overlay drawn on the game display with the FPS, a frame time graph,
+how many entities and callbacks there are and rays cast per frame.
+F3 shows and hides it.
+
+Each character is rendered once and kept, and the text is only
+put together a few times a second, so most frames the HUD
+is a fill, two blits and a line.
+"""
+
+# Imports:
+import time
+import pygame
+from collections import deque
+from pygame import locals as pgl
+from gamebase import GameBase
+from character import CharacterClass
+from detect_col import CollisionDetection
+
+
+class PerfHUD:
+    """ Toggleable frame stats overlay """
+
+    TOGGLE_KEY = pgl.K_F3
+    FONT_SIZE = 14
+    TEXT_COLOR = (235, 235, 235)
+    PANEL_COLOR = (20, 20, 20)
+    PADDING = 3
+    POSITION = (4, 4)
+    # How often the text is refreshed, in seconds:
+    REFRESH_TIME = 0.25
+
+    # Frame time graph, one pixel wide bar per frame:
+    GRAPH_SIZE = (120, 36)
+    GRAPH_MAX_MS = 33.3
+    GRAPH_COLOR = (90, 200, 90)
+    GRAPH_SLOW_COLOR = (220, 80, 60)
+    # Frames slower than this are drawn in GRAPH_SLOW_COLOR:
+    GRAPH_SLOW_MS = 1000 / 60
+
+    def __init__(self, game: GameBase, shown: bool = False):
+        """ Class initilizer. Adds the HUD to the game loop.
+
+        Args:
+            game (GameBase): The game to draw on.
+            shown (bool): Starts shown instead of hidden.
+        """
+        self.game = game
+        self.shown = shown
+
+        # Seconds between the last frames, newest last:
+        self.frame_times = deque(maxlen=self.GRAPH_SIZE[0])
+        self.last_frame_time = None
+        self.last_rays_cast = CollisionDetection.s_rays_cast
+        self.rays_per_frame = 0
+        # How long the HUD took to draw last frame, in seconds:
+        self.draw_time = 0
+
+        # Made when first drawn, once pygame has started:
+        self.font = None
+        self.glyphs = {}
+        self.text_surf = None
+        self.graph_surf = None
+        self.next_refresh = 0
+        # Display rect it was last drawn at, for dirty rect rendering:
+        self.panel_rect = None
+        # The frame last counted, render is called once for each
+        # dirty rect in dirty rect mode:
+        self.counted_frame = None
+
+        game.add_to_update_event_functions(self.check_toggle)
+        game.add_to_render_functions(self.render)
+        game.add_to_dirty_rect_functions(self.report_dirty_rect)
+
+    # =============================
+    # ---  Text  ------------------
+    # =============================
+
+    def get_glyph(self, char: str) -> pygame.Surface:
+        """ Returns the cached image of a character """
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            if self.font is None:
+                if not pygame.font.get_init():
+                    pygame.font.init()
+                self.font = pygame.font.Font(None, self.FONT_SIZE)
+            glyph = self.font.render(char, False, self.TEXT_COLOR)
+            self.glyphs[char] = glyph
+        return glyph
+
+    def render_lines(self, lines: list) -> pygame.Surface:
+        """ Draws lines of text with the cached glyphs """
+        rows = [[self.get_glyph(char) for char in line] for line in lines]
+        line_height = self.font.get_linesize()
+        width = max(sum(g.get_width() for g in row) for row in rows)
+        surf = pygame.Surface((width, line_height * len(rows)))
+        surf.fill(self.PANEL_COLOR)
+        blits = []
+        for row_index, row in enumerate(rows):
+            x = 0
+            y = row_index * line_height
+            for glyph in row:
+                blits.append((glyph, (x, y)))
+                x += glyph.get_width()
+        surf.blits(blits, doreturn=False)
+        return surf
+
+    def get_lines(self) -> list:
+        """ Returns the lines of stats to show """
+        if self.frame_times:
+            average = sum(self.frame_times) / len(self.frame_times)
+            worst = max(self.frame_times)
+        else:
+            average = worst = 0
+        fps = 1 / average if average else 0
+        return [
+            f'FPS {fps:6.1f}  avg {average * 1000:5.2f}ms  '
+            f'max {worst * 1000:5.2f}ms',
+            f'entities {CharacterClass.s_instance_counter + 1}  '
+            f'hitables {len(CollisionDetection.s_hitables)}',
+            f'callbacks early {len(GameBase.update_early_functions)}  '
+            f'event {len(GameBase.update_event_functions)}  '
+            f'update {len(GameBase.update_functions)}  '
+            f'late {len(GameBase.update_late_functions)}  '
+            f'render {len(GameBase.render_functions)}',
+            f'rays/frame {self.rays_per_frame}  '
+            f'hud {self.draw_time * 1000:4.2f}ms',
+        ]
+
+    # =============================
+    # ---  Graph  -----------------
+    # =============================
+
+    def graph_bar(self, x: int, frame_time: float) -> None:
+        """ Draws one frame's bar in the graph at column x """
+        width, height = self.GRAPH_SIZE
+        ms = frame_time * 1000
+        bar = min(height, int(ms / self.GRAPH_MAX_MS * height))
+        color = self.GRAPH_COLOR
+        if ms > self.GRAPH_SLOW_MS:
+            color = self.GRAPH_SLOW_COLOR
+        if bar > 0:
+            pygame.draw.line(self.graph_surf, color,
+                             (x, height - 1), (x, height - bar))
+
+    def redraw_graph(self) -> None:
+        """ Draws the whole graph from the kept frame times """
+        if self.graph_surf is None:
+            self.graph_surf = pygame.Surface(self.GRAPH_SIZE)
+        self.graph_surf.fill(self.PANEL_COLOR)
+        start = self.GRAPH_SIZE[0] - len(self.frame_times)
+        for i, frame_time in enumerate(self.frame_times):
+            self.graph_bar(start + i, frame_time)
+
+    def scroll_graph(self, frame_time: float) -> None:
+        """ Moves the graph left a pixel and adds the newest frame """
+        width, height = self.GRAPH_SIZE
+        self.graph_surf.scroll(-1, 0)
+        self.graph_surf.fill(self.PANEL_COLOR, (width - 1, 0, 1, height))
+        self.graph_bar(width - 1, frame_time)
+
+    # =============================
+    # ---  Update loop  -----------
+    # =============================
+
+    def show(self, b: bool) -> None:
+        """ Shows or hides the HUD """
+        self.shown = b
+        # Rebuilt from the kept frames next draw:
+        self.graph_surf = None
+        self.next_refresh = 0
+        self.panel_rect = None
+        self.game.request_full_redraw()
+
+    def check_toggle(self, delta, event) -> None:
+        """ Toggles the HUD when the toggle key is pressed """
+        if event.type == pgl.KEYDOWN and event.key == self.TOGGLE_KEY:
+            self.show(not self.shown)
+
+    def count_frame(self) -> None:
+        """ Keeps the frame time and rays cast, and updates the
+            graph and text, once a frame
+        """
+        if self.counted_frame == GameBase.frame_count:
+            return
+        self.counted_frame = GameBase.frame_count
+
+        now = time.perf_counter()
+        frame_time = None
+        if self.last_frame_time is not None:
+            frame_time = now - self.last_frame_time
+            self.frame_times.append(frame_time)
+        self.last_frame_time = now
+
+        rays_cast = CollisionDetection.s_rays_cast
+        self.rays_per_frame = rays_cast - self.last_rays_cast
+        self.last_rays_cast = rays_cast
+
+        if not self.shown:
+            return
+
+        if self.graph_surf is None:
+            self.redraw_graph()
+        elif frame_time is not None:
+            self.scroll_graph(frame_time)
+        if now >= self.next_refresh:
+            self.next_refresh = now + self.REFRESH_TIME
+            self.text_surf = self.render_lines(self.get_lines())
+
+        pad = self.PADDING
+        x, y = self.POSITION
+        width = max(self.text_surf.get_width(), self.GRAPH_SIZE[0])
+        height = self.text_surf.get_height() + self.GRAPH_SIZE[1] + pad
+        self.panel_rect = pygame.Rect(x, y, width + pad * 2, height + pad * 2)
+        self.draw_time = time.perf_counter() - now
+
+    def report_dirty_rect(self, alpha) -> None:
+        """ Marks the HUD to be redrawn, it changes every frame """
+        last_rect = self.panel_rect
+        self.count_frame()
+        if not self.shown:
+            return
+        if last_rect is not None:
+            self.game.add_dirty_rect(last_rect)
+        self.game.add_dirty_rect(self.panel_rect)
+
+    def render(self, alpha) -> None:
+        """ Draws the HUD over everything if it's shown """
+        self.count_frame()
+        if self.shown:
+            self.game.queue_draw(self.draw, GameBase.LAYER_UI)
+
+    def draw(self) -> None:
+        """ Draws the panel, text and graph """
+        start = time.perf_counter()
+        display = self.game.display
+        pad = self.PADDING
+        x, y = self.POSITION
+        display.fill(self.PANEL_COLOR, self.panel_rect)
+        display.blits([
+            (self.text_surf, (x + pad, y + pad)),
+            (self.graph_surf,
+             (x + pad, y + pad * 2 + self.text_surf.get_height())),
+        ], doreturn=False)
+        self.draw_time += time.perf_counter() - start
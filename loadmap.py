@@ -1,12 +1,27 @@
 """
 Loads a map from an image
 and places tiles for map in game.
+
+Big maps can be streamed, so only the chunks around
+the camera target are decoded and kept in memory.
+
+Decoded maps are saved to a small compiled file,
+so the next start up can skip reading the image.
 """
 
 # Imports:
+import hashlib
+import math
+import os
+import struct
+from collections import OrderedDict
+import numpy as np
+import pygame
 from gamebase import GameBase
 from character import CharacterClass
 from detect_col import CollisionDetection
+from tilemap import TileMap
+from tracing import trace_span
 
 
 class MapLoader:
@@ -22,33 +37,186 @@ class MapLoader:
     GROUND_COLOR = (125, 125, 125)
     WALL_COLOR = (0, 0, 0)
 
+    # Tile ids stored in the tile_types array:
+    TILE_NONE = 0
+    TILE_GROUND = 1
+    TILE_WALL = 2
+    # Which color in the map image makes which tile:
+    TILE_COLORS = {
+        GROUND_COLOR: TILE_GROUND,
+        WALL_COLOR: TILE_WALL,
+    }
+
     # TODO: Remove hard coding of the tile files:
     # Maybe use a Json or something?
     GROUND_TILE_IMG_PATH = 'assets/purple_ground_4_64.png'
-    WALL_TILE_IMG_PATH = 'assets/wall_2.png'
+    WALL_TILE_IMG_PATH = 'assets/Wall_2.png'
     TILE_SIZE = 64  # TODO make it auto get from tile files.
 
-    def __init__(self, game: GameBase, map_img_path: str):
-        """ Class initilizer """
+    # How many tiles wide and high each pre-rendered chunk is:
+    CHUNK_TILES = 8
+    # How many chunks out from the camera target stay loaded when streaming:
+    DEFAULT_RESIDENCY_RADIUS = 2
+
+    # Compiled map files: a header then the raw uint8 tile ids, x first.
+    MAP_CACHE_DIR = '.map_cache'
+    MAP_CACHE_MAGIC = b'TMAP'
+    MAP_CACHE_VERSION = 2
+    # magic, version, width, height, sha1 of the map image file,
+    # sha1 of the colors to tile ids table and DECODER_VERSION
+    MAP_CACHE_HEADER = struct.Struct('<4sHII20s20s')
+    # Change when decode_tile_types turns colors in to different ids,
+    # so the compiled files made before aren't read:
+    DECODER_VERSION = 1
+    # Color drawn over tiles that are hit, same as CharacterClass.draw_rect
+    HIGHLIGHT_COLOR = (20, 200, 20)
+
+    def __init__(
+            self,
+            game: GameBase,
+            map_img_path: str,
+            streaming: bool = False,
+            residency_radius: int = DEFAULT_RESIDENCY_RADIUS,
+            max_cached_chunks: int = None,
+            use_map_cache: bool = True
+    ):
+        """ Class initilizer
+
+        Args:
+            game (GameBase): The game.
+            map_img_path (str): Path to the map layout image.
+            streaming (bool): Only decode and draw the chunks around the
+            camera target instead of the whole map up front.
+            residency_radius (int): How many chunks out from the camera
+            target's chunk are kept loaded when streaming.
+            max_cached_chunks (int): How many chunks stay in memory
+            before the least recently used are unloaded. Defaults to
+            a ring of chunks more than the resident ones.
+            use_map_cache (bool): Read the tile ids from the compiled map
+            file in MAP_CACHE_DIR, and write it if it's missing or the
+            map image has changed.
+        """
         # so only 1 game can be used in all instances:
         if MapLoader.game is None:
             MapLoader.game = game
+        tracer = game.tracer
+        if tracer is not None:
+            trace_start = tracer.now()
 
-        # Loads map image and get colors from map:
-        self.map_img = game.load_image(map_img_path)
+        # [x][y] tile ids of the whole map, if they have been read.
+        # From the map cache this is a memmap so it's read lazily.
+        self.map_tile_types = None
+        self.map_img = None
+        if use_map_cache:
+            with trace_span(tracer, 'map_read_cache', 'map'):
+                self.map_tile_types = self.read_map_cache(map_img_path)
+
+        if self.map_tile_types is None:
+            # Loads map image and get colors from map.
+            # Not converted so the colors are read exactly as saved:
+            self.map_img = game.load_image(map_img_path, convert=False)
+            # Streaming without a cache decodes each chunk as it's needed:
+            if use_map_cache or not streaming:
+                with trace_span(tracer, 'map_decode', 'map'):
+                    self.map_tile_types = self.decode_tile_types(
+                        self.map_img)
+            if use_map_cache:
+                with trace_span(tracer, 'map_write_cache', 'map'):
+                    self.write_map_cache(map_img_path, self.map_tile_types)
 
         # Initilizte defaults based on map
-        self.map_size_x = self.map_img.get_width()
-        self.map_size_y = self.map_img.get_height()
-        self.color_for_tiles = self.add_colors_to_list(self.map_img)
-        # Create empty tile list:
-        self.tile_list = []
-        # Spawn the tiles:
-        self.spawn_tiles()
-
-    # set each pixel color to a list
-    def add_colors_to_list(self, map_img):
-        """ loop though img pixels to get tile colors for map"""
+        if self.map_tile_types is not None:
+            self.map_size_x, self.map_size_y = self.map_tile_types.shape
+        else:
+            self.map_size_x = self.map_img.get_width()
+            self.map_size_y = self.map_img.get_height()
+        # Images to draw the tiles with, by the tile map's render index:
+        self.tile_imgs = [
+            None,
+            game.load_image(self.GROUND_TILE_IMG_PATH),
+            game.load_image(self.WALL_TILE_IMG_PATH),
+        ]
+        # (chunk_x, chunk_y) -> Surface with the chunk's tiles drawn on it,
+        # or None for chunks with no tiles. Least recently used first.
+        self.chunks = OrderedDict()
+
+        # Streaming setup:
+        self.streaming = streaming
+        self.residency_radius = residency_radius
+        if max_cached_chunks is None:
+            max_cached_chunks = (residency_radius * 2 + 3) ** 2
+        # Never less than the chunks that have to be resident:
+        self.max_cached_chunks = max(
+            max_cached_chunks, (residency_radius * 2 + 1) ** 2)
+        # (chunk_x, chunk_y) -> tile ids of the chunk, kept with self.chunks
+        self.chunk_tile_types = {}
+        # (chunk_x, chunk_y) -> {(x, y) in the chunk: tile id} set with
+        # TileMap.set_tile, put back when the chunk is loaded again:
+        self.chunk_edits = {}
+        # Chunks with changed tiles to bake again before drawing:
+        self.stale_chunks = set()
+        # Indexes of changed tiles, for dirty rect rendering:
+        self.changed_tiles = []
+        # The chunk the loaded tiles are centered on:
+        self.resident_center = None
+        self.chunk_loads = 0
+        self.chunk_evictions = 0
+
+        # Tile ids, collision and render indexes, one per map pixel.
+        # Its origin stays put in the world, the camera moves instead:
+        if streaming:
+            # Starts empty, the chunks are loaded around the target:
+            self.tile_map = self.create_tile_map(
+                np.zeros((0, 0), dtype=np.uint8))
+            self.stream_chunks()
+        else:
+            # Copied, the memmap from the map cache is read only
+            # and the tiles can be changed with TileMap.set_tile:
+            self.tile_map = self.create_tile_map(
+                np.array(self.map_tile_types))
+            # Bake the tiles:
+            with trace_span(tracer, 'map_bake', 'map'):
+                self.spawn_tiles()
+
+        self.tile_map.add_to_tile_changed_functions(self.tile_changed)
+        # Lets the ray casts walk this map:
+        CollisionDetection.s_tile_map = self.tile_map
+        # What was drawn last frame, for dirty rect rendering:
+        self.drawn_highlights = set()
+        # Streams and draws the map each frame:
+        game.add_to_update_functions(self.update)
+        game.add_to_render_functions(self.render)
+        game.add_to_dirty_rect_functions(self.report_dirty_rect)
+        if tracer is not None:
+            tracer.complete('map_load', trace_start, None, 'map')
+
+    # Turns the map image in to tile ids:
+    @classmethod
+    def decode_tile_types(cls, map_img) -> np.ndarray:
+        """ Returns a uint8 [x][y] array of tile ids for the map image """
+        # surfarray is already indexed X first and Y second like the tiles.
+        rgb = pygame.surfarray.array3d(map_img).astype(np.uint32)
+        # Packs each pixel's color in to a single number to look up:
+        keys = (rgb[:, :, 0] << 16) | (rgb[:, :, 1] << 8) | rgb[:, :, 2]
+
+        colors = sorted(cls.TILE_COLORS)
+        color_keys = np.array(
+            [(c[0] << 16) | (c[1] << 8) | c[2] for c in colors],
+            dtype=np.uint32)
+        color_ids = np.array(
+            [cls.TILE_COLORS[c] for c in colors], dtype=np.uint8)
+
+        # Colors that aren't a tile become TILE_NONE:
+        found = np.searchsorted(color_keys, keys)
+        found = np.minimum(found, len(color_keys) - 1)
+        is_tile = color_keys[found] == keys
+        return np.where(is_tile, color_ids[found], cls.TILE_NONE).astype(
+            np.uint8)
+
+    # The old way of reading the map, kept to benchmark against:
+    @classmethod
+    def decode_tile_types_loops(cls, map_img) -> np.ndarray:
+        """ loop though img pixels to get tile ids for map """
 
         # Normally people do left to right, top to bottom
         # But i wanted to keep X first and Y second
@@ -64,56 +232,366 @@ class MapLoader:
         for x in range(map_img.get_width()):
             pixel_colors_y = []
             for y in range(map_img.get_height()):
-                pixel_colors_y.append(map_img.get_at((x, y))[:3])
+                col = tuple(map_img.get_at((x, y))[:3])
+                pixel_colors_y.append(cls.TILE_COLORS.get(col, cls.TILE_NONE))  # noqa
             pixel_colors_all.append(pixel_colors_y)
-        return pixel_colors_all
+        return np.array(pixel_colors_all, dtype=np.uint8).reshape(
+            map_img.get_width(), map_img.get_height())
+
+    # =============================
+    # ---  Compiled Map Cache  ----
+    # =============================
+
+    @classmethod
+    def get_map_cache_path(cls, map_img_path: str) -> str:
+        """ Returns where the compiled file for a map image is kept """
+        # The full path is hashed in so maps with the same name don't clash
+        path_hash = hashlib.sha1(
+            os.path.abspath(map_img_path).encode()).hexdigest()[:8]
+        name = os.path.basename(map_img_path)
+        return os.path.join(cls.MAP_CACHE_DIR, f'{name}.{path_hash}.tmap')
+
+    def hash_map_file(self, map_img_path: str) -> bytes:
+        """ Returns the sha1 of the map image file """
+        digest = hashlib.sha1()
+        with open(map_img_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.digest()
+
+    @classmethod
+    def hash_decoder(cls) -> bytes:
+        """ Returns the sha1 of what turns colors in to tile ids """
+        table = sorted(cls.TILE_COLORS.items())
+        return hashlib.sha1(repr(
+            (cls.DECODER_VERSION, cls.TILE_NONE, table)).encode()).digest()
+
+    def read_map_cache(self, map_img_path: str):
+        """ Returns the cached tile ids as a read only memmap,
+            or None if there is no cache or it's stale.
+        """
+        cache_path = self.get_map_cache_path(map_img_path)
+        header_size = self.MAP_CACHE_HEADER.size
+        try:
+            with open(cache_path, 'rb') as f:
+                header = f.read(header_size)
+            if len(header) != header_size:
+                return None
+            magic, version, width, height, digest, decoder = \
+                self.MAP_CACHE_HEADER.unpack(header)
+            if magic != self.MAP_CACHE_MAGIC:
+                return None
+            if version != self.MAP_CACHE_VERSION:
+                return None
+            if os.path.getsize(cache_path) != header_size + width * height:
+                return None
+            if decoder != self.hash_decoder():
+                return None
+            if digest != self.hash_map_file(map_img_path):
+                return None
+        except OSError:
+            return None
+        return np.memmap(cache_path, dtype=np.uint8, mode='r',
+                         offset=header_size, shape=(width, height))
+
+    def write_map_cache(self, map_img_path: str, tile_types: np.ndarray):
+        """ Saves the tile ids to the compiled map file """
+        cache_path = self.get_map_cache_path(map_img_path)
+        width, height = tile_types.shape
+        header = self.MAP_CACHE_HEADER.pack(
+            self.MAP_CACHE_MAGIC, self.MAP_CACHE_VERSION, width, height,
+            self.hash_map_file(map_img_path), self.hash_decoder())
+        try:
+            os.makedirs(self.MAP_CACHE_DIR, exist_ok=True)
+            # Written to a temp file first so a half written cache
+            # is never read:
+            temp_path = cache_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(header)
+                f.write(np.ascontiguousarray(tile_types, np.uint8).tobytes())
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # The cache is only for speed, the map still works without it.
+            pass
+
+    # Makes the tile map from decoded tile ids:
+    def create_tile_map(self, tile_types: np.ndarray) -> TileMap:
+        """ Wraps tile ids in a TileMap with this map's tile rules """
+        return TileMap(
+            tile_types,
+            MapLoader.TILE_SIZE,
+            solid_types=(MapLoader.TILE_WALL,),
+            render_indexes={
+                MapLoader.TILE_GROUND: 1,
+                MapLoader.TILE_WALL: 2,
+            },
+            map_size=(self.map_size_x, self.map_size_y),
+        )
 
     # Spawn the tiles to the world:
     def spawn_tiles(self):
-        """ Spawns tiles to game """
-        # Spawns tiles as either character classes for bg image
-        # Or as colidable  objects for walls:
-        tile: CharacterClass = None
-        self.tile_list.clear()
-
-        # Nested while loops was the fast of all.
-        # Lool at the bottom of the file for details.
-        x = -1
-        y = -1
-        while x < self.map_size_x - 1:
-            x += 1
-            y = -1  # Resets nested loop var
-            while y < self.map_size_y - 1:
-                y += 1
-
-                # Sets x and y pos for the map tiles:
-                x_pos = x * MapLoader.TILE_SIZE
-                y_pos = y * MapLoader.TILE_SIZE
-
-                # Grabs the color to select which tile to place:
-                col = self.color_for_tiles[x][y]
-
-                # Selects and places the tiles based on color:
-                if col == self.WALL_COLOR:
-                    tile = self.create_wall_tile()
-                elif col == self.GROUND_COLOR:
-                    tile = self.create_ground_tile()
-                tile.set_position([x_pos, y_pos])
-                self.tile_list.append(tile)  # Adds to tile list
-
-    # Creates and returns the ground tile
-    def create_ground_tile(self) -> CharacterClass:
-        ''' Makes ground tiles from character class '''
-        t = CharacterClass(self.game, self.GROUND_TILE_IMG_PATH,
-                           tag=CharacterClass.TAG_WORLD)
-        t.set_is_collidable(False)
-        return t
-
-    # Creates and returns the wall tiles:
-    def create_wall_tile(self) -> CharacterClass:
-        ''' Makes Wall Tiles from character class '''
-        return CollisionDetection(self.game, self.WALL_TILE_IMG_PATH,
-                                  tag=CollisionDetection.TAG_WORLD)
+        """ Bakes the tiles in to chunk surfaces """
+        # The tiles never change, so instead of an object per tile
+        # they're drawn once in to a few big surfaces,
+        # and walls are kept in the tile map for collision.
+        self.chunks.clear()
+        render_index = self.tile_map.render_index
+        chunk_tiles = MapLoader.CHUNK_TILES
+
+        for cx in range(math.ceil(self.map_size_x / chunk_tiles)):
+            for cy in range(math.ceil(self.map_size_y / chunk_tiles)):
+                self.chunks[(cx, cy)] = self.bake_chunk(
+                    (cx, cy), render_index[
+                        cx * chunk_tiles:(cx + 1) * chunk_tiles,
+                        cy * chunk_tiles:(cy + 1) * chunk_tiles])
+
+    # Draws a chunk's tiles in to its surface:
+    def bake_chunk(self, chunk_key, chunk_render: np.ndarray):
+        """ Returns the chunk surface, or None if it has no tiles """
+        xs, ys = np.nonzero(chunk_render)
+        if not len(xs):
+            return None
+        size = MapLoader.TILE_SIZE
+        tile_imgs = self.tile_imgs
+        chunk = self.create_chunk(chunk_key)
+        # Blitting all its tiles in one call:
+        chunk.blits([
+            (tile_imgs[img_index], (x * size, y * size))
+            for x, y, img_index in zip(
+                xs.tolist(), ys.tolist(), chunk_render[xs, ys].tolist())
+        ], doreturn=False)
+        return chunk
+
+    # Creates an empty chunk surface:
+    def create_chunk(self, chunk_key) -> pygame.Surface:
+        """ Makes the surface a chunk of tiles gets drawn on """
+        size = MapLoader.TILE_SIZE
+        chunk_tiles = MapLoader.CHUNK_TILES
+        # Chunks on the right and bottom edge may be smaller:
+        tiles_x = min(chunk_tiles, self.map_size_x - chunk_key[0] * chunk_tiles)  # noqa
+        tiles_y = min(chunk_tiles, self.map_size_y - chunk_key[1] * chunk_tiles)  # noqa
+        chunk = pygame.Surface((tiles_x * size, tiles_y * size))
+        # Match the display's pixel format so blits are fast:
+        if pygame.display.get_surface() is not None:
+            chunk = chunk.convert()
+        chunk.fill(GameBase.bg_color)
+        return chunk
+
+    # =============================
+    # ---  Streaming  -------------
+    # =============================
+
+    def get_chunk_rect(self, chunk_key) -> pygame.Rect:
+        """ Returns the map pixels, or tiles, a chunk covers """
+        chunk_tiles = MapLoader.CHUNK_TILES
+        x = chunk_key[0] * chunk_tiles
+        y = chunk_key[1] * chunk_tiles
+        return pygame.Rect(x, y, min(chunk_tiles, self.map_size_x - x),
+                           min(chunk_tiles, self.map_size_y - y))
+
+    def load_chunk(self, chunk_key) -> np.ndarray:
+        """ Returns a chunk's tile ids, decoding and baking it if needed """
+        if chunk_key in self.chunks:
+            # Marks it as the most recently used:
+            self.chunks.move_to_end(chunk_key)
+            return self.chunk_tile_types[chunk_key]
+
+        tracer = self.game.tracer
+        if tracer is not None:
+            trace_start = tracer.now()
+        rect = self.get_chunk_rect(chunk_key)
+        if self.map_tile_types is not None:
+            # Copied so it doesn't keep the memmap pages around:
+            tile_types = np.array(self.map_tile_types[
+                rect.left:rect.right, rect.top:rect.bottom])
+        else:
+            tile_types = self.decode_tile_types(self.map_img.subsurface(rect))
+        # Tiles changed since the map was loaded:
+        for (x, y), tile_type in self.chunk_edits.get(chunk_key, {}).items():
+            tile_types[x, y] = tile_type
+        self.chunk_tile_types[chunk_key] = tile_types
+        self.chunks[chunk_key] = self.bake_chunk(
+            chunk_key, self.tile_map.render_lookup[tile_types])
+        self.chunk_loads += 1
+        if tracer is not None:
+            tracer.complete('map_load_chunk', trace_start, None, 'map')
+        return tile_types
+
+    def unload_old_chunks(self) -> None:
+        """ Unloads the least recently used chunks over the cache size """
+        while len(self.chunks) > self.max_cached_chunks:
+            chunk_key, _ = self.chunks.popitem(last=False)
+            del self.chunk_tile_types[chunk_key]
+            self.chunk_evictions += 1
+
+    def stream_chunks(self) -> None:
+        """ Loads the chunks around the camera target in to the tile map """
+        chunk_tiles = MapLoader.CHUNK_TILES
+        target = CharacterClass.s_cam_target
+        if target is None:
+            center = (0, 0)
+        else:
+            tile = self.tile_map.world_to_tile(*target.get_position())
+            center = (tile[0] // chunk_tiles, tile[1] // chunk_tiles)
+        # Nothing to do until the target moves to another chunk:
+        if center == self.resident_center:
+            return
+        self.resident_center = center
+
+        # The chunks in the radius that are on the map:
+        radius = self.residency_radius
+        last_cx = math.ceil(self.map_size_x / chunk_tiles) - 1
+        last_cy = math.ceil(self.map_size_y / chunk_tiles) - 1
+        min_cx = min(max(center[0] - radius, 0), last_cx)
+        min_cy = min(max(center[1] - radius, 0), last_cy)
+        max_cx = max(min(center[0] + radius, last_cx), min_cx)
+        max_cy = max(min(center[1] + radius, last_cy), min_cy)
+
+        # Copies the resident chunks in to one window for the tile map:
+        offset = (min_cx * chunk_tiles, min_cy * chunk_tiles)
+        end_rect = self.get_chunk_rect((max_cx, max_cy))
+        window = np.zeros((end_rect.right - offset[0],
+                           end_rect.bottom - offset[1]), dtype=np.uint8)
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                rect = self.get_chunk_rect((cx, cy))
+                window[rect.left - offset[0]:rect.right - offset[0],
+                       rect.top - offset[1]:rect.bottom - offset[1]] = \
+                    self.load_chunk((cx, cy))
+        self.tile_map.set_window(window, offset)
+        self.unload_old_chunks()
+        # Newly loaded chunks may be on screen:
+        self.game.request_full_redraw()
+
+    # =============================
+    # ---  Changed Tiles  ---------
+    # =============================
+
+    def tile_changed(self, tile_x: int, tile_y: int, tile_type: int):
+        """ Keeps a tile changed with TileMap.set_tile
+            and bakes its chunk again before it's drawn next.
+        """
+        chunk_tiles = MapLoader.CHUNK_TILES
+        chunk_key = (tile_x // chunk_tiles, tile_y // chunk_tiles)
+        if self.streaming:
+            x = tile_x - chunk_key[0] * chunk_tiles
+            y = tile_y - chunk_key[1] * chunk_tiles
+            # The loaded chunk and the chunk when it's loaded again:
+            self.chunk_tile_types[chunk_key][x, y] = tile_type
+            self.chunk_edits.setdefault(chunk_key, {})[(x, y)] = tile_type
+        self.stale_chunks.add(chunk_key)
+        self.changed_tiles.append(
+            self.tile_map.get_tile_index(tile_x, tile_y))
+
+    def bake_stale_chunks(self) -> None:
+        """ Bakes the chunks with changed tiles again """
+        for chunk_key in self.stale_chunks:
+            if self.streaming:
+                # Unloaded ones are baked with the changes when loaded:
+                if chunk_key not in self.chunks:
+                    continue
+                render = self.tile_map.render_lookup[
+                    self.chunk_tile_types[chunk_key]]
+            else:
+                rect = self.get_chunk_rect(chunk_key)
+                render = self.tile_map.render_index[
+                    rect.left:rect.right, rect.top:rect.bottom]
+            self.chunks[chunk_key] = self.bake_chunk(chunk_key, render)
+        self.stale_chunks.clear()
+
+    def get_stream_stats(self) -> dict:
+        """ Returns how many chunks are loaded, and have been """
+        return {
+            'cached_chunks': len(self.chunks),
+            'resident_tiles': self.tile_map.width * self.tile_map.height,
+            'chunk_loads': self.chunk_loads,
+            'chunk_evictions': self.chunk_evictions,
+        }
+
+    # =============================
+    # ---  Drawing  ---------------
+    # =============================
+
+    def get_render_origin(self) -> list:
+        """ Returns where the map's origin is on the display this frame """
+        origin = self.tile_map.origin
+        offset = self.game.camera.offset
+        # This helps from tile tearing and collapsing
+        return [math.floor(origin[0]) - offset[0],
+                math.floor(origin[1]) - offset[1]]
+
+    def draw_chunks(self) -> None:
+        """ Blits the chunks that are in the camera's view """
+        if self.stale_chunks:
+            self.bake_stale_chunks()
+        chunk_px = MapLoader.TILE_SIZE * MapLoader.CHUNK_TILES
+        ox, oy = self.get_render_origin()
+        view = self.game.camera.get_view_rect()
+
+        # Only the range of chunks under the display:
+        min_cx = (-ox) // chunk_px
+        min_cy = (-oy) // chunk_px
+        max_cx = (view.width - 1 - ox) // chunk_px
+        max_cy = (view.height - 1 - oy) // chunk_px
+        for cx in range(int(min_cx), int(max_cx) + 1):
+            for cy in range(int(min_cy), int(max_cy) + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is not None:
+                    self.game.queue_blit(
+                        chunk, (ox + cx * chunk_px, oy + cy * chunk_px),
+                        GameBase.LAYER_WORLD)
+
+    def get_highlighted_tiles(self) -> set:
+        """ Returns the indexes of the walls hit by a ray
+            or overlapping the player
+        """
+        tile_map = self.tile_map
+        highlighted = set(tile_map.ray_hit_tiles)
+        player = CharacterClass.s_player
+        if player is not None:
+            for tile in tile_map.tiles_in_rect(player.rect, solid_only=True):
+                highlighted.add(tile_map.get_tile_index(tile[0], tile[1]))
+        return highlighted
+
+    def get_tile_draw_rect(self, tile_index: int) -> pygame.Rect:
+        """ Returns the display rect a tile is drawn at """
+        origin = self.get_render_origin()
+        tile = self.tile_map.get_tile_coords(tile_index)
+        size = MapLoader.TILE_SIZE
+        return pygame.Rect(origin[0] + tile[0] * size,
+                           origin[1] + tile[1] * size,
+                           size, size)
+
+    def draw_tile_highlights(self) -> None:
+        """ Colors over walls hit by a ray or overlapping the player.
+            Used more as a debuger, like CharacterClass.draw_rect
+        """
+        for tile_index in self.get_highlighted_tiles():
+            pygame.draw.rect(self.game.display, self.HIGHLIGHT_COLOR,
+                             self.get_tile_draw_rect(tile_index))
+
+    def report_dirty_rect(self, alpha) -> None:
+        """ Marks the highlights and tiles that changed.
+            The camera redraws everything when it moves.
+        """
+        highlighted = self.get_highlighted_tiles()
+        for tile_index in highlighted ^ self.drawn_highlights:
+            self.game.add_dirty_rect(
+                self.get_tile_draw_rect(tile_index))
+        self.drawn_highlights = highlighted
+        for tile_index in self.changed_tiles:
+            self.game.add_dirty_rect(self.get_tile_draw_rect(tile_index))
+        self.changed_tiles = []
+
+    def update(self, delta) -> None:
+        """ The function that gets sent to the game loop """
+        if self.streaming:
+            self.stream_chunks()
+
+    def render(self, alpha) -> None:
+        """ Draws the map """
+        self.draw_chunks()
+        self.game.queue_draw(self.draw_tile_highlights, GameBase.LAYER_WORLD)
 
 
 # Used for testing:
@@ -125,6 +603,13 @@ if __name__ == '__main__':
 # Depending on the use it could be slowest.
 # More testing is needed....
 
+# ---  Test per pixel loops vs numpy map decoding:
+# - Run: python benchmark.py map-decode
+# - Result: numpy won by about 18 times on every size
+# - 256x256 Loops: 0.0609  Numpy: 0.0025
+# - 1024x1024 Loops: 0.8164  Numpy: 0.0440
+# The timeit tests below are kept for history.
+
 # ---  Test Nested Loop vs Math loop speed:
 # - Result: Nested loop won by 1/3 the speed
 # - Nested loop: 2.160943499999121
@@ -15,14 +15,21 @@
     I can go in to more detail in to the frame work then.
     --
     WASD, LShift, ESC are the only keys working.
+    The keys can be changed in bindings.json.
+    F3 shows the performance HUD.
 """
 
 # Imports:
+import argparse
+import math
 import pygame
 from gamebase import GameBase
 from user_input import UserInputs
 from loadmap import MapLoader
 from detect_col import CollisionDetection
+from hud import PerfHUD
+from replay import InputRecorder
+from proximity import ProximityTracker
 
 
 # Default Final screen size
@@ -34,13 +41,27 @@ SCREEN_SIZE = [1240, 760]
 # so I devide by 4 to get the center of that.
 SCREEN_CENTER = [SCREEN_SIZE[0]/4, SCREEN_SIZE[1]/4]
 
+# Default map layout
+MAP_PATH = 'assets/map1.png'
+
 
 # A test class for the game:
 class TestGame:
     """ Testing game """
 
-    def __init__(self):
-        """ Initialize game """
+    def __init__(
+            self,
+            start: bool = True,
+            map_path: str = MAP_PATH,
+            streaming: bool = False,
+            record_path: str = None
+    ):
+        """ Initialize game.
+            With start as False the game is set up but the loop
+            isn't started, so it can be driven one frame at a time.
+            With a record_path the inputs of every frame are saved
+            to it, to play back with benchmark.py replay.
+        """
         # TODO: Use a config file for some of these settings:
 
         # Initialize game screen
@@ -48,7 +69,7 @@ class TestGame:
             SCREEN_SIZE[0], SCREEN_SIZE[1], 'Pygame Game')
 
         # Load map
-        self.loaded_map = MapLoader(self.game, 'assets/map1.png')
+        self.loaded_map = MapLoader(self.game, map_path, streaming=streaming)
         # Path for player img.
         self.player_img = 'assets/box_character_16.png'
         # Player input:
@@ -62,12 +83,28 @@ class TestGame:
                                          )
         # Sets the starting position in game:
         self.player.set_position([100, 100])
+        # Keeps what's near the player and camera target,
+        # after the player has moved each step:
+        self.proximity = ProximityTracker(self.game)
         # Defaults player jump setting:
         self.jump_ressed = False
+        # Last raycast, kept to be drawn:
+        self.ray_from = None
+        self.hit_info = None
+        self.drawn_ray_rect = None
 
         # Adds update_loop method to game loop
         self.game.add_to_update_functions(self.update_loop)
-        self.game.start_main()  # Starts the game
+        self.game.add_to_render_functions(self.render_loop)
+        self.game.add_to_dirty_rect_functions(self.report_dirty_rect)
+        # Frame stats overlay, F3 to show:
+        self.hud = PerfHUD(self.game)
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = InputRecorder(
+                self.game, self.player_input, record_path)
+        if start:
+            self.game.start_main()  # Starts the game
 
     # Teleport method for anyone that needs it:
     # This could be added to the player, NPC, or
@@ -131,9 +168,9 @@ class TestGame:
         min_d = 10  # slightly more then half the size of player
         max_d = 30  # Arbitary number that feels interesting
 
-        # Draws the line to visualize the raycast:
-        pygame.draw.line(self.game.display, (200, 50, 50),
-                         rect_center, hit_info['hit_point'], 2)
+        # Kept to draw the line to visualize the raycast:
+        self.ray_from = rect_center
+        self.hit_info = hit_info
 
         # If raycast hit something do things:
         if hit_info['has_hit']:
@@ -157,6 +194,67 @@ class TestGame:
             if hit_info['hit_distance'] < min_d and is_same_direct:
                 self.player.set_input_direction([0, 0])
 
+    def get_ray_line(self, alpha) -> tuple:
+        """ Returns the start and end of the raycast line on the display,
+            moved along with the drawn player
+        """
+        # How far the drawn player is from where it is,
+        # less the camera to go from world to display coords:
+        render_pos = self.player.get_render_position(alpha)
+        offset = self.game.camera.offset
+        shift_x = render_pos[0] - self.player.get_position()[0] - offset[0]
+        shift_y = render_pos[1] - self.player.get_position()[1] - offset[1]
+        hit_point = self.hit_info['hit_point']
+        return ((self.ray_from[0] + shift_x, self.ray_from[1] + shift_y),
+                (hit_point[0] + shift_x, hit_point[1] + shift_y))
+
+    def render_loop(self, alpha):
+        """ Draws the raycast line """
+        if self.hit_info is None:
+            return
+        start, end = self.get_ray_line(alpha)
+        # Draws the line to visualize the raycast, over the player:
+        self.game.queue_draw(
+            lambda: self.draw_ray_line(start, end), GameBase.LAYER_PLAYER)
+
+    def draw_ray_line(self, start, end):
+        """ Draws the raycast line 2 pixels wide.
+            pygame skips a wide line if its middle is outside the clip,
+            so two thin lines are drawn to redraw part of it
+            in dirty rect mode.
+        """
+        color = (200, 50, 50)
+        display = self.game.display
+        steep = abs(end[1] - start[1]) > abs(end[0] - start[0])
+        for i in range(2):
+            if steep:
+                pygame.draw.line(display, color, (start[0] + i, start[1]),
+                                 (end[0] + i, end[1]))
+            else:
+                pygame.draw.line(display, color, (start[0], start[1] + i),
+                                 (end[0], end[1] + i))
+
+    def report_dirty_rect(self, alpha):
+        """ Marks the old and new raycast line to be redrawn """
+        if self.hit_info is None:
+            return
+        start, end = self.get_ray_line(alpha)
+        rect = pygame.Rect(
+            math.floor(min(start[0], end[0])) - 2,
+            math.floor(min(start[1], end[1])) - 2,
+            math.ceil(abs(end[0] - start[0])) + 5,
+            math.ceil(abs(end[1] - start[1])) + 5)
+        if rect == self.drawn_ray_rect:
+            return
+        if self.drawn_ray_rect is not None:
+            self.game.add_dirty_rect(self.drawn_ray_rect)
+        self.game.add_dirty_rect(rect)
+        self.drawn_ray_rect = rect
+
 
 # Initiates the game:
-test_game = TestGame()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', metavar='PATH',
+                        help='save the inputs to replay later')
+    test_game = TestGame(record_path=parser.parse_args().record)
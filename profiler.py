@@ -0,0 +1,262 @@
+"""
+Frame Profiler
+
+Keeps the time each phase of the game loop took
+for the last few hundred frames in a fixed size ring buffer,
+so slow frames can be picked apart while the game runs.
+
+CallbackSampler times every registered callback on some frames
+and adds them up by the class and tag of the object they belong to.
+"""
+
+# Imports:
+import time
+import numpy as np
+
+from collections import deque
+
+
+class FrameProfiler:
+    """ Ring buffer of per phase frame timings """
+
+    # The phases of GameBase.run_frame:
+    PHASE_EARLY = 'early'
+    PHASE_EVENTS = 'events'
+    PHASE_UPDATE = 'update'
+    PHASE_LATE = 'late'
+    PHASE_RENDER = 'render'
+    PHASE_PRESENT = 'present'
+    PHASES = (
+        PHASE_EARLY,
+        PHASE_EVENTS,
+        PHASE_UPDATE,
+        PHASE_LATE,
+        PHASE_RENDER,
+        PHASE_PRESENT,
+    )
+    # The whole frame is kept in the column after the phases:
+    TOTAL = 'total'
+
+    DEFAULT_SIZE = 600
+
+    def __init__(self, size: int = DEFAULT_SIZE):
+        """ Class initilizer
+
+        Args:
+            size (int): How many frames are kept.
+        """
+        self.size = size
+        # One row per frame, in seconds:
+        self.times = np.zeros((size, len(self.PHASES) + 1))
+        # Next row to write to:
+        self.index = 0
+        # How many rows have been written, up to size:
+        self.count = 0
+
+    def clear(self) -> None:
+        """ Forgets all recorded frames """
+        self.index = 0
+        self.count = 0
+
+    def record(self, phase_times: list) -> None:
+        """ Adds a frame. phase_times are in seconds, in PHASES order """
+        row = self.times[self.index]
+        row[:-1] = phase_times
+        row[-1] = sum(phase_times)
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def get_recent(self, frames: int = None) -> np.ndarray:
+        """ Returns the last frames as rows, oldest first """
+        if frames is None or frames > self.count:
+            frames = self.count
+        rows = np.arange(self.index - frames, self.index) % self.size
+        return self.times[rows]
+
+    def _columns_to_dict(self, values) -> dict:
+        """ Names each column's value, in milliseconds """
+        names = self.PHASES + (self.TOTAL,)
+        return {name: float(v) * 1000 for name, v in zip(names, values)}
+
+    def get_averages(self, frames: int = None) -> dict:
+        """ Returns the rolling average of each phase in milliseconds """
+        recent = self.get_recent(frames)
+        if not len(recent):
+            return {}
+        return self._columns_to_dict(recent.mean(axis=0))
+
+    def get_percentile(self, percent: float, frames: int = None) -> dict:
+        """ Returns a percentile of each phase in milliseconds """
+        recent = self.get_recent(frames)
+        if not len(recent):
+            return {}
+        return self._columns_to_dict(np.percentile(recent, percent, axis=0))
+
+    def get_last_frame(self) -> dict:
+        """ Returns the phases of the last frame in milliseconds """
+        return self.get_averages(1)
+
+    def get_stats(self, frames: int = None) -> dict:
+        """ Returns the average, p50, p95, p99 and max of each phase """
+        recent = self.get_recent(frames)
+        if not len(recent):
+            return {}
+        return {
+            'frames': len(recent),
+            'mean': self._columns_to_dict(recent.mean(axis=0)),
+            'p50': self._columns_to_dict(np.percentile(recent, 50, axis=0)),
+            'p95': self._columns_to_dict(np.percentile(recent, 95, axis=0)),
+            'p99': self._columns_to_dict(np.percentile(recent, 99, axis=0)),
+            'max': self._columns_to_dict(recent.max(axis=0)),
+        }
+
+
+class PhaseTimer:
+    """ Times the phases of each frame for the profiler and tracer.
+        GameBase.run_frame marks the end of each phase.
+    """
+
+    def __init__(self, profiler: FrameProfiler = None, tracer=None):
+        """ Class initilizer
+
+        Args:
+            profiler (FrameProfiler): Gets each frame's phase times.
+            tracer (TraceWriter): Gets a span for each frame and phase.
+        """
+        self.profiler = profiler
+        self.tracer = tracer
+        self.index_of = {
+            phase: i for i, phase in enumerate(FrameProfiler.PHASES)}
+        self.times = [0.0] * len(FrameProfiler.PHASES)
+        self.start = 0.0
+        self.last = 0.0
+
+    def begin_frame(self) -> None:
+        """ Starts timing a frame """
+        self.times = [0.0] * len(FrameProfiler.PHASES)
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, phase: str) -> None:
+        """ Adds the time since the last mark to a phase.
+            With fixed steps each sim phase is the total of its steps.
+        """
+        now = time.perf_counter()
+        self.times[self.index_of[phase]] += now - self.last
+        self.last = now
+
+    def end_frame(self) -> None:
+        """ Sends the frame's times on """
+        times = self.times
+        if self.profiler is not None:
+            self.profiler.record(times)
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.complete('frame', self.start, self.last, 'loop')
+            # Laid out back to back, as the steps are interleaved:
+            t0 = self.start
+            for name, spent in zip(FrameProfiler.PHASES, times):
+                tracer.complete(name, t0, t0 + spent, 'loop')
+                t0 += spent
+
+
+class NullPhaseTimer:
+    """ Phase timer that does nothing, used when not profiling """
+
+    def begin_frame(self) -> None:
+        pass
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+
+class CallbackSampler:
+    """ Times each update callback every few frames,
+        grouped by owner class and tag.
+    """
+
+    DEFAULT_EVERY = 30
+    DEFAULT_WINDOW = 20
+
+    def __init__(self, every: int = DEFAULT_EVERY,
+                 window: int = DEFAULT_WINDOW):
+        """ Class initilizer
+
+        Args:
+            every (int): Sample one frame out of this many.
+            window (int): How many sampled frames are kept.
+        """
+        self.every = max(1, every)
+        self.frame = 0
+        # One {(owner, tag): [seconds, calls]} dict per sampled frame:
+        self.samples = deque(maxlen=window)
+        self._current = None
+
+    def clear(self) -> None:
+        """ Forgets all sampled frames """
+        self.frame = 0
+        self.samples.clear()
+
+    def begin_frame(self) -> bool:
+        """ Counts a frame. Returns True if this frame is sampled """
+        self.frame += 1
+        if self.frame % self.every:
+            return False
+        self._current = {}
+        self.samples.append(self._current)
+        return True
+
+    @staticmethod
+    def get_callback_key(funct) -> tuple:
+        """ Returns the (owner class, tag) a callback is grouped by.
+            Plain functions are grouped by their own name.
+        """
+        owner = getattr(funct, '__self__', None)
+        if owner is None:
+            return (getattr(funct, '__qualname__', repr(funct)), None)
+        return (type(owner).__name__, getattr(owner, 'tag', None))
+
+    def call(self, functions: list, *args) -> None:
+        """ Calls each function with args, timing each one """
+        clock = time.perf_counter
+        totals = self._current
+        get_key = self.get_callback_key
+        for f in functions:
+            start = clock()
+            f(*args)
+            spent = clock() - start
+
+            # Worked out each time, not kept, so owners aren't kept
+            # alive and tags changed with set_tag are picked up:
+            key = get_key(f)
+            total = totals.get(key)
+            if total is None:
+                totals[key] = [spent, 1]
+            else:
+                total[0] += spent
+                total[1] += 1
+
+    def get_top(self, count: int = 10) -> list:
+        """ Returns the most expensive owners over the window,
+            with their average ms and calls per sampled frame.
+        """
+        frames = len(self.samples)
+        if not frames:
+            return []
+        totals = {}
+        for sample in self.samples:
+            for key, (spent, calls) in sample.items():
+                total = totals.setdefault(key, [0.0, 0])
+                total[0] += spent
+                total[1] += calls
+        ranked = sorted(totals.items(), key=lambda item: -item[1][0])
+        return [{
+            'owner': owner,
+            'tag': tag,
+            'ms_per_frame': spent * 1000 / frames,
+            'calls_per_frame': calls / frames,
+            'us_per_call': spent * 1000000 / calls,
+        } for (owner, tag), (spent, calls) in ranked[:count]]
@@ -0,0 +1,180 @@
+"""
+Proximity Tracking
+
+Keeps CharacterClass.s_chars_near_player, s_chars_near_target
+and s_chars_near_projectile up to date each sim step,
+and lets listeners know when something comes near or goes away.
+
+Uses the spatial grid of CollisionDetection, so only the cells
+around each watched object are looked at and the cost goes with
+how many things are near, not how many there are in total.
+Only hitables are in the grid, so only they are tracked.
+"""
+
+# Imports:
+from typing import Callable
+from character import CharacterClass
+from detect_col import CollisionDetection
+from spatial_grid import SpatialGrid
+
+
+class ProximityWatch:
+    """ The things within a radius of one or more objects """
+
+    def __init__(self, name: str, get_centers: Callable, near: dict,
+                 radius: float = None):
+        """ Class initilizer
+
+        Args:
+            name (str): What the watch is called.
+            get_centers (Callable): Returns the objects to watch around.
+            near (dict): Filled with what's near, keyed by id.
+            radius (float): How near, None for
+                CharacterClass.s_player_dist_max.
+        """
+        self.name = name
+        self.get_centers = get_centers
+        self.near = near
+        self.radius = radius
+        # (on_enter, on_exit) pairs, each called with the object:
+        self.listeners = []
+
+    def get_radius(self) -> float:
+        """ Returns the radius, the default one if not set """
+        if self.radius is None:
+            return CharacterClass.s_player_dist_max
+        return self.radius
+
+
+class ProximityTracker:
+    """ Tracks what's near the player, camera target and projectiles """
+
+    WATCH_PLAYER = 'player'
+    WATCH_TARGET = 'target'
+    WATCH_PROJECTILE = 'projectile'
+
+    def __init__(self, game, grid: SpatialGrid = None):
+        """ Class initilizer. Adds the tracking to the game loop.
+
+        Args:
+            game (GameBase): The game to track in.
+            grid (SpatialGrid): Index to search, the hitables by default.
+        """
+        self.game = game
+        self.grid = grid if grid is not None else CollisionDetection.s_grid
+        self.watches = {}
+        # Objects looked at last step, for the stats:
+        self.checked = 0
+
+        self.add_watch(self.WATCH_PLAYER,
+                       lambda: [CharacterClass.s_player],
+                       CharacterClass.s_chars_near_player)
+        self.add_watch(self.WATCH_TARGET,
+                       lambda: [CharacterClass.s_cam_target],
+                       CharacterClass.s_chars_near_target)
+        self.add_watch(self.WATCH_PROJECTILE,
+                       lambda: CharacterClass.s_projectiles.values(),
+                       CharacterClass.s_chars_near_projectile)
+
+        game.add_to_update_functions(self.update)
+
+    # =============================
+    # --- Setters and Getters : ---
+    # =============================
+
+    def add_watch(self, name: str, get_centers: Callable,
+                  near: dict = None, radius: float = None):
+        """ Tracks what's within radius of the objects get_centers returns.
+            Returns the watch.
+        """
+        watch = ProximityWatch(
+            name, get_centers, near if near is not None else {}, radius)
+        self.watches[name] = watch
+        return watch
+
+    def set_radius(self, name: str, radius: float) -> None:
+        """ Sets how near counts for a watch, None for the default """
+        self.watches[name].radius = radius
+
+    def add_listener(self, name: str, on_enter: Callable = None,
+                     on_exit: Callable = None) -> None:
+        """ Calls on_enter and on_exit with an object when it
+            comes within or goes out of a watch's radius.
+        """
+        self.watches[name].listeners.append((on_enter, on_exit))
+
+    def get_near(self, name: str) -> dict:
+        """ Returns what's near for a watch, keyed by id """
+        return self.watches[name].near
+
+    # =============================
+    # ---  Queries  ---------------
+    # =============================
+
+    def query_radius(self, position, radius: float, tag: str = None,
+                     exclude=None) -> list:
+        """ Returns the hitables within radius of a position """
+        found = self.grid.query_radius(position[0], position[1], radius)
+        return [obj for obj in found
+                if (tag is None or obj.tag == tag) and obj is not exclude]
+
+    def nearest(self, position, count: int = 1, max_radius: float = None,
+                tag: str = None, exclude=None) -> list:
+        """ Returns the count closest hitables to a position,
+            closest first. Only searches as far as max_radius,
+            see SpatialGrid.nearest for the default.
+        """
+        def where(obj):
+            return (tag is None or obj.tag == tag) and obj is not exclude
+        return self.grid.nearest(position[0], position[1], count,
+                                 max_radius, where)
+
+    # =============================
+    # ---  Update loop  -----------
+    # =============================
+
+    def update_watch(self, watch: ProximityWatch) -> None:
+        """ Finds what's near a watch now and lets the listeners know
+            what came near and what went away.
+        """
+        radius = watch.get_radius()
+        found = {}
+        for center in watch.get_centers():
+            if center is None:
+                continue
+            x, y = center.rect.center
+            objs = self.grid.query_radius(x, y, radius)
+            self.checked += len(objs)
+            for obj in objs:
+                if obj is not center:
+                    found[obj.id] = obj
+
+        # Kept in place so anything holding the dict sees the changes:
+        near = watch.near
+        exited = [obj for obj_id, obj in near.items() if obj_id not in found]
+        entered = [obj for obj_id, obj in found.items() if obj_id not in near]
+        for obj in exited:
+            del near[obj.id]
+        near.update(found)
+
+        for on_enter, on_exit in watch.listeners:
+            if on_exit is not None:
+                for obj in exited:
+                    on_exit(obj)
+            if on_enter is not None:
+                for obj in entered:
+                    on_enter(obj)
+
+    def update(self, delta) -> None:
+        """ Updates every watch """
+        self.checked = 0
+        for watch in self.watches.values():
+            self.update_watch(watch)
+
+    def get_stats(self) -> dict:
+        """ Returns how many are near for each watch,
+            and how many objects were looked at last step.
+        """
+        stats = {name: len(watch.near) for name, watch in self.watches.items()}
+        stats['checked'] = self.checked
+        return stats
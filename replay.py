@@ -0,0 +1,188 @@
+"""
+Input Recording and Replay
+
+InputRecorder saves how long each frame took and which actions
+were held to a small binary file while the game is played.
+InputReplayer feeds that file back in to the game frame for frame,
+ignoring the window's events, so a play session can be run again
+headless and timed the same way on different builds.
+
+File layout, little endian:
+    header: magic b'TDRP', version (uint16),
+            sim steps per second (uint16, 0 for variable step),
+            most sim steps per frame (uint16),
+            size of the action names (uint16)
+    action names: utf-8, one per line. Bit i of a frame's mask
+                  is the i-th action.
+    frames: frame time in seconds (float64),
+            held actions (uint16 mask)
+"""
+
+# Imports:
+import atexit
+import struct
+from gamebase import GameBase
+from user_input import UserInputs
+
+
+class InputRecorder:
+    """ Writes the frame time and held actions of every frame """
+
+    MAGIC = b'TDRP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHHH')
+    FRAME = struct.Struct('<dH')
+    # Bits in a frame's mask:
+    MAX_ACTIONS = 16
+
+    def __init__(self, game: GameBase, inputs: UserInputs, path: str):
+        """ Class initilizer. Starts recording with the next frame.
+
+        Args:
+            game (GameBase): The game to record.
+            inputs (UserInputs): The inputs to record.
+            path (str): The file to write.
+        """
+        self.game = game
+        self.inputs = inputs
+        self.path = path
+        self.actions = list(inputs.is_key_pressed)
+        if len(self.actions) > self.MAX_ACTIONS:
+            raise ValueError(
+                f'Can only record {self.MAX_ACTIONS} actions, '
+                f'{len(self.actions)} are bound')
+        self.frames = 0
+        self.closed = False
+
+        self._file = open(path, 'wb')
+        # After UserInputs, so the actions are set for the frame:
+        game.add_to_input_functions(self.record)
+        # The game exits with sys.exit, this makes sure it's all written:
+        atexit.register(self.close)
+
+    def write_header(self) -> None:
+        """ Writes the header, with the step mode the game has now """
+        tick_rate = self.game.tick_rate if self.game.fixed_step else 0
+        names = '\n'.join(self.actions).encode('utf-8')
+        self._file.write(self.HEADER.pack(
+            self.MAGIC, self.VERSION, tick_rate, self.game.max_steps,
+            len(names)))
+        self._file.write(names)
+
+    def record(self, frame_time) -> None:
+        """ Writes this frame's time and the held actions """
+        if self.closed:
+            return
+        # Written on the first frame, once the step mode is set:
+        if not self.frames:
+            self.write_header()
+        pressed = self.inputs.is_key_pressed
+        mask = 0
+        for bit, action in enumerate(self.actions):
+            if pressed[action]:
+                mask |= 1 << bit
+        self._file.write(self.FRAME.pack(frame_time, mask))
+        self.frames += 1
+
+    def close(self) -> dict:
+        """ Stops recording and closes the file """
+        if not self.closed:
+            self.closed = True
+            if not self.frames:
+                self.write_header()
+            self._file.close()
+        return {'path': self.path, 'frames': self.frames}
+
+
+class InputReplayer:
+    """ Plays a recorded file back in to the game """
+
+    def __init__(self, game: GameBase, inputs: UserInputs, path: str):
+        """ Class initilizer. Reads the whole file.
+
+        Args:
+            game (GameBase): The game to play it in.
+            inputs (UserInputs): The inputs to set each frame.
+            path (str): The recorded file.
+        """
+        self.game = game
+        self.inputs = inputs
+        self.path = path
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        header = InputRecorder.HEADER
+        if len(data) < header.size:
+            raise ValueError(f'{path} is not an input recording')
+        magic, version, self.tick_rate, self.max_steps, names_size = \
+            header.unpack_from(data)
+        if magic != InputRecorder.MAGIC:
+            raise ValueError(f'{path} is not an input recording')
+        if version != InputRecorder.VERSION:
+            raise ValueError(
+                f'{path} is version {version}, '
+                f'expected {InputRecorder.VERSION}')
+        start = header.size + names_size
+        names = data[header.size:start].decode('utf-8')
+        self.actions = names.split('\n') if names else []
+
+        frame = InputRecorder.FRAME
+        # A cut off last frame is left out:
+        end = start + (len(data) - start) // frame.size * frame.size
+        self.frames = list(frame.iter_unpack(data[start:end]))
+        self.frame_index = 0
+        self._mask = 0
+        self.playing = False
+        # The game's own event pump, put back by stop:
+        self._window_events = None
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def get_sim_time(self) -> float:
+        """ Returns the recorded time of every frame added up """
+        return sum(frame_time for frame_time, _ in self.frames)
+
+    def start(self) -> None:
+        """ Sets the game up the way it was recorded
+            and stops it reading the window's events.
+        """
+        if self.tick_rate:
+            self.game.set_fixed_step(self.tick_rate, self.max_steps)
+        else:
+            self.game.set_variable_step()
+        self.inputs.set_polling(False)
+        self.frame_index = 0
+        self.playing = True
+        self._window_events = GameBase.event_pump
+        GameBase.event_pump = self.event_pump
+
+    def stop(self) -> None:
+        """ Gives the window's events back to the game """
+        if self.playing:
+            self.playing = False
+            GameBase.event_pump = self._window_events
+
+    def event_pump(self) -> list:
+        """ Sets the recorded actions in place of the window's events """
+        mask = self._mask
+        pressed = self.inputs.is_key_pressed
+        for bit, action in enumerate(self.actions):
+            # Actions no longer bound are skipped:
+            if action in pressed:
+                pressed[action] = bool(mask & (1 << bit))
+        return []
+
+    def play_frame(self) -> bool:
+        """ Runs the next recorded frame.
+            Returns False once every frame has been played.
+        """
+        if self.frame_index >= len(self.frames):
+            self.stop()
+            return False
+        if not self.playing:
+            self.start()
+        frame_time, self._mask = self.frames[self.frame_index]
+        self.frame_index += 1
+        self.game.run_frame(frame_time)
+        return True
@@ -0,0 +1,217 @@
+"""
+Uniform grid spatial index.
+
+Buckets objects with a 'rect' and an 'id' in to fixed size cells
+so ray casts and overlap tests only have to look at the
+objects in the cells they touch instead of every object in the game.
+"""
+
+# Imports:
+import math
+import pygame
+
+
+class SpatialGrid:
+    """ Spatial hash of objects keyed by the cells their rect covers. """
+
+    DEFAULT_CELL_SIZE = 64
+    # How many cells out nearest searches without a max_radius,
+    # so a point with few objects near it never walks the whole grid:
+    NEAREST_MAX_CELLS = 8
+
+    def __init__(self, cell_size: int = DEFAULT_CELL_SIZE):
+        """ Class initilizer """
+        self.cell_size = cell_size
+        # (cell_x, cell_y) -> {obj.id: obj}
+        # Dicts keep insertion order so queries are stable.
+        self.cells = {}
+        # obj.id -> (min_cx, min_cy, max_cx, max_cy)
+        self._obj_cells = {}
+        # (min_cx, min_cy, max_cx, max_cy) of every cell used so far,
+        # None when empty. Only grows until clear, so it may be bigger
+        # than the cells in use, never smaller:
+        self.bounds = None
+
+    def __len__(self):
+        return len(self._obj_cells)
+
+    def __contains__(self, obj):
+        return obj.id in self._obj_cells
+
+    # =============================
+    # ---  Cell Math  -------------
+    # =============================
+
+    def cell_of(self, x, y) -> tuple:
+        """ Returns the cell a point is in """
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def cell_range(self, rect: pygame.Rect) -> tuple:
+        """ Returns the min and max cells a rect covers """
+        size = self.cell_size
+        # right and bottom are exclusive for pygame rects:
+        return (
+            rect.left // size,
+            rect.top // size,
+            (rect.right - 1) // size if rect.w > 0 else rect.left // size,
+            (rect.bottom - 1) // size if rect.h > 0 else rect.top // size,
+        )
+
+    # =============================
+    # ---  Add, Move, Remove  -----
+    # =============================
+
+    def insert(self, obj) -> None:
+        """ Adds an object to every cell its rect covers """
+        if obj.id in self._obj_cells:
+            self.move(obj)
+            return
+        cell_range = self.cell_range(obj.rect)
+        self._add_to_cells(obj, cell_range)
+        self._obj_cells[obj.id] = cell_range
+
+    def remove(self, obj) -> None:
+        """ Removes an object from the grid """
+        cell_range = self._obj_cells.pop(obj.id, None)
+        if cell_range is not None:
+            self._remove_from_cells(obj, cell_range)
+
+    def move(self, obj) -> None:
+        """ Re-buckets an object after its rect has changed.
+            Only touches the cells if the covered cells changed.
+        """
+        old_range = self._obj_cells.get(obj.id)
+        if old_range is None:
+            return
+        new_range = self.cell_range(obj.rect)
+        if new_range == old_range:
+            return
+        self._remove_from_cells(obj, old_range)
+        self._add_to_cells(obj, new_range)
+        self._obj_cells[obj.id] = new_range
+
+    def clear(self) -> None:
+        """ Empties the grid """
+        self.cells.clear()
+        self._obj_cells.clear()
+        self.bounds = None
+
+    def _add_to_cells(self, obj, cell_range) -> None:
+        """ Places the object in each cell of the range """
+        min_cx, min_cy, max_cx, max_cy = cell_range
+        cells = self.cells
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cell = cells[(cx, cy)] = {}
+                cell[obj.id] = obj
+
+        bounds = self.bounds
+        if bounds is None:
+            self.bounds = cell_range
+        elif (min_cx < bounds[0] or min_cy < bounds[1] or
+                max_cx > bounds[2] or max_cy > bounds[3]):
+            self.bounds = (min(min_cx, bounds[0]), min(min_cy, bounds[1]),
+                           max(max_cx, bounds[2]), max(max_cy, bounds[3]))
+
+    def _remove_from_cells(self, obj, cell_range) -> None:
+        """ Takes the object out of each cell of the range """
+        min_cx, min_cy, max_cx, max_cy = cell_range
+        cells = self.cells
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                cell.pop(obj.id, None)
+                # Drop empty cells so the dict doesn't grow forever:
+                if not cell:
+                    del cells[(cx, cy)]
+
+    # =============================
+    # ---  Queries  ---------------
+    # =============================
+
+    def query_point(self, x, y) -> list:
+        """ Returns objects whose rect contains the point """
+        cell = self.cells.get(self.cell_of(x, y))
+        if not cell:
+            return []
+        return [obj for obj in cell.values() if obj.rect.collidepoint(x, y)]
+
+    def query_rect(self, rect: pygame.Rect) -> list:
+        """ Returns objects whose rect overlaps the rect """
+        min_cx, min_cy, max_cx, max_cy = self.cell_range(rect)
+        found = {}
+        cells = self.cells
+        range_size = (max_cx - min_cx + 1) * (max_cy - min_cy + 1)
+        if range_size > len(cells):
+            # Fewer cells in use than in the range, so only look at those:
+            in_range = [cell for (cx, cy), cell in cells.items()
+                        if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy]
+        else:
+            in_range = [cells.get((cx, cy))
+                        for cx in range(min_cx, max_cx + 1)
+                        for cy in range(min_cy, max_cy + 1)]
+        for cell in in_range:
+            if not cell:
+                continue
+            for obj_id, obj in cell.items():
+                if obj_id not in found and obj.rect.colliderect(rect):
+                    found[obj_id] = obj
+        return list(found.values())
+
+    def query_radius(self, x, y, radius) -> list:
+        """ Returns objects with their rect center within radius of x, y """
+        left = math.floor(x - radius)
+        top = math.floor(y - radius)
+        # The whole square around the circle, centers on the edge included:
+        rect = pygame.Rect(left, top,
+                           math.floor(x + radius) - left + 1,
+                           math.floor(y + radius) - top + 1)
+        radius_sq = radius * radius
+        found = []
+        for obj in self.query_rect(rect):
+            dx = obj.rect.centerx - x
+            dy = obj.rect.centery - y
+            if dx * dx + dy * dy <= radius_sq:
+                found.append(obj)
+        return found
+
+    def nearest(self, x, y, count: int = 1, max_radius=None,
+                where=None) -> list:
+        """ Returns up to count objects with their rect center closest
+            to the point, closest first. where can filter the objects.
+            Searches out from the point until it has enough,
+            up to max_radius, or NEAREST_MAX_CELLS cells if not given.
+        """
+        if count <= 0 or not self.cells:
+            return []
+        size = self.cell_size
+        if max_radius is None:
+            max_radius = self.NEAREST_MAX_CELLS * size
+        # No further than every cell that's been used:
+        min_cx, min_cy, max_cx, max_cy = self.bounds
+        reach = math.hypot(
+            max(abs(x - min_cx * size), abs(x - (max_cx + 1) * size)),
+            max(abs(y - min_cy * size), abs(y - (max_cy + 1) * size)))
+        max_radius = min(max_radius, reach)
+
+        radius = min(size, max_radius)
+        while True:
+            found = self.query_radius(x, y, radius)
+            if where is not None:
+                found = [obj for obj in found if where(obj)]
+            # Everything within radius is found, so if there are enough
+            # the closest ones are in there:
+            if len(found) >= count or radius >= max_radius:
+                break
+            radius = min(radius * 2, max_radius)
+
+        def dist_sq(obj):
+            dx = obj.rect.centerx - x
+            dy = obj.rect.centery - y
+            return (dx * dx + dy * dy, obj.id)
+        found.sort(key=dist_sq)
+        return found[:count]
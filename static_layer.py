@@ -0,0 +1,102 @@
+"""
+Static Layer
+
+Draws every sleeping character with one render function
+and one dirty rect function, instead of each of them
+being called every frame.
+
+Sleeping characters are kept in a spatial grid so each frame
+only the ones in the part of the world being drawn are looked at.
+Nothing is done for them per frame otherwise, so a thousand
+sleeping crates cost about the same as none.
+"""
+
+# Imports:
+from spatial_grid import SpatialGrid
+
+
+class StaticLayer:
+    """ Draws the sleeping characters """
+
+    def __init__(self, game, store):
+        """ Class initilizer. Adds the drawing to the game loop.
+
+        Args:
+            game (GameBase): The game to draw in.
+            store (EntityStore): Where the characters' positions are.
+        """
+        self.game = game
+        self.store = store
+        self.grid = SpatialGrid()
+        # World rects that changed since the last frame drawn:
+        self.changed = []
+        # How many were drawn last frame, for the stats:
+        self.drawn = 0
+
+        game.add_to_render_functions(self.render)
+        game.add_to_dirty_rect_functions(self.report_dirty_rect)
+
+    def __len__(self):
+        return len(self.grid)
+
+    # =============================
+    # ---  Add, Move, Remove  -----
+    # =============================
+
+    def add(self, entity) -> None:
+        """ Starts drawing a character """
+        self.grid.insert(entity)
+        self._mark_changed(entity.rect)
+
+    def remove(self, entity) -> None:
+        """ Stops drawing a character """
+        if entity not in self.grid:
+            return
+        self.grid.remove(entity)
+        self._mark_changed(entity.rect)
+
+    def move(self, entity, old_rect) -> None:
+        """ Draws a character at its new rect """
+        self.grid.move(entity)
+        self._mark_changed(old_rect)
+        self._mark_changed(entity.rect)
+
+    def _mark_changed(self, rect) -> None:
+        """ Marks a world rect to be redrawn """
+        # Drawn at the floored position, the rect is rounded,
+        # so a pixel each way covers both:
+        self.changed.append(rect.inflate(2, 2))
+
+    # =============================
+    # ---  Drawing  ---------------
+    # =============================
+
+    def render(self, alpha) -> None:
+        """ Queues the sleeping characters on the display """
+        game = self.game
+        camera = game.camera
+        offset = camera.offset
+        entities = self.grid.query_rect(camera.view_rect.inflate(2, 2))
+        self.drawn = len(entities)
+        if not entities:
+            return
+        positions = self.store.get_draw_positions(
+            alpha, offset, game.frame_count)
+        # Same order they were made in, like the render list:
+        entities.sort(key=lambda entity: entity.id)
+        for entity in entities:
+            game.queue_blit(entity.img, positions[entity.slot],
+                            entity.render_layer)
+
+    def report_dirty_rect(self, alpha) -> None:
+        """ Marks where characters fell asleep, woke or were moved """
+        if not self.changed:
+            return
+        offset = self.game.camera.offset
+        for rect in self.changed:
+            self.game.add_dirty_rect(rect.move(-offset[0], -offset[1]))
+        self.changed = []
+
+    def get_stats(self) -> dict:
+        """ Returns how many are asleep and were drawn last frame """
+        return {'sleeping': len(self), 'drawn': self.drawn}
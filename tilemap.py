@@ -0,0 +1,208 @@
+"""
+Tile Map
+
+Holds every tile of a map in a few contiguous arrays
+instead of an object per tile.
+Each tile is a tile id, if it's solid and which image draws it,
+so a tile costs a few bytes and nothing per frame.
+
+The arrays can also cover just a window of a bigger map,
+for maps that are streamed in by chunks.
+Grid coords and tile indexes are always for the whole map.
+"""
+
+# Imports:
+import math
+import numpy as np
+import pygame
+
+
+class TileMap:
+    """ Array backed grid of tiles, indexed [x][y] """
+
+    def __init__(
+            self,
+            tile_types: np.ndarray,
+            tile_size: int,
+            solid_types: tuple = (),
+            render_indexes: dict = None,
+            map_size: tuple = None
+    ):
+        """ Class initilizer
+
+        Args:
+            tile_types (np.ndarray): [x][y] array of tile ids.
+            tile_size (int): Size of a tile in pixels.
+            solid_types (tuple): Tile ids that block movement and rays.
+            render_indexes (dict): tile id -> index of the image that
+            draws it. Tile ids left out are not drawn (index 0).
+            map_size (tuple): Tiles wide and high of the whole map,
+            if tile_types is only a window of it. Defaults to its shape.
+        """
+        self.tile_size = tile_size
+        # Where the top left corner of the whole map is in the world:
+        self.origin = [0, 0]
+        # Indexes of the tiles currently hit by a ray:
+        self.ray_hit_tiles = set()
+        # Called with the grid coords and new tile id of changed tiles:
+        self.tile_changed_functions = []
+
+        # Lookup tables indexed by tile id:
+        self.solid_lookup = np.zeros(256, dtype=bool)
+        self.solid_lookup[list(solid_types)] = True
+        self.render_lookup = np.zeros(256, dtype=np.uint8)
+        for tile_type, render_index in (render_indexes or {}).items():
+            self.render_lookup[tile_type] = render_index
+
+        self.set_window(tile_types, (0, 0))
+        if map_size is None:
+            map_size = self.tile_types.shape
+        self.map_width, self.map_height = map_size
+
+    def set_window(self, tile_types: np.ndarray, offset) -> None:
+        """ Replaces the tile arrays.
+
+        Args:
+            tile_types (np.ndarray): [x][y] array of tile ids.
+            offset: Grid coords of the whole map that tile_types [0][0]
+            is at. Tiles outside the window act like empty tiles.
+        """
+        self.tile_types = np.ascontiguousarray(tile_types, dtype=np.uint8)
+        self.width, self.height = self.tile_types.shape
+        self.offset = [int(offset[0]), int(offset[1])]
+        self.solid = self.solid_lookup[self.tile_types]
+        self.render_index = self.render_lookup[self.tile_types]
+        # Indexing a memoryview is about as fast as a list of lists
+        # for single tile lookups, without the 8 bytes per tile:
+        self._solid_view = memoryview(self.solid)
+
+    # =============================
+    # --- Setters and Getters : ---
+    # =============================
+
+    def set_tile(self, tile_x: int, tile_y: int, tile_type: int) -> None:
+        """ Changes the tile at the grid coords.
+            Raises IndexError for tiles outside the loaded tiles.
+        """
+        if not self.in_bounds(tile_x, tile_y):
+            raise IndexError(
+                f'Tile {tile_x}, {tile_y} is outside the loaded tiles')
+        x = tile_x - self.offset[0]
+        y = tile_y - self.offset[1]
+        self.tile_types[x, y] = tile_type
+        self.solid[x, y] = self.solid_lookup[tile_type]
+        self.render_index[x, y] = self.render_lookup[tile_type]
+        for f in self.tile_changed_functions:
+            f(tile_x, tile_y, tile_type)
+
+    def add_to_tile_changed_functions(self, funct) -> None:
+        """ Adds a function called with tile_x, tile_y and tile_type
+            each time set_tile changes a tile
+        """
+        self.tile_changed_functions.append(funct)
+
+    def get_tile_type(self, tile_x: int, tile_y: int) -> int:
+        """ Returns the tile id at the grid coords """
+        return int(self.tile_types[tile_x - self.offset[0],
+                                   tile_y - self.offset[1]])
+
+    def get_tile_size(self) -> int:
+        """ Returns the size of a tile in pixels """
+        return self.tile_size
+
+    def get_grid_size(self) -> list:
+        """ Returns how many tiles wide and high the whole map is """
+        return [self.map_width, self.map_height]
+
+    def get_map_origin(self) -> list:
+        """ Returns where the top left corner of the map is """
+        return self.origin
+
+    def get_window_origin(self) -> list:
+        """ Returns where the top left corner of the arrays is """
+        return self.tile_to_world(self.offset[0], self.offset[1])
+
+    def get_solid_array(self) -> np.ndarray:
+        """ Returns the [x][y] bool array of solid tiles.
+            [0][0] is the tile at offset, see get_window_origin.
+        """
+        return self.solid
+
+    def get_memory_bytes(self) -> int:
+        """ Returns the bytes used by the per tile arrays """
+        return (self.tile_types.nbytes + self.solid.nbytes +
+                self.render_index.nbytes)
+
+    # =============================
+    # ---  Grid Math  -------------
+    # =============================
+
+    def in_bounds(self, tile_x: int, tile_y: int) -> bool:
+        """ Returns if the grid coords are inside the loaded tiles """
+        return (0 <= tile_x - self.offset[0] < self.width and
+                0 <= tile_y - self.offset[1] < self.height)
+
+    def get_tile_index(self, tile_x: int, tile_y: int) -> int:
+        """ Returns the index of the tile in the map, x first """
+        return tile_x * self.map_height + tile_y
+
+    def get_tile_coords(self, tile_index: int) -> list:
+        """ Returns the grid coords of a tile index """
+        return [tile_index // self.map_height, tile_index % self.map_height]
+
+    def world_to_tile(self, x, y) -> list:
+        """ Returns the grid coords of the tile under a point """
+        return [math.floor((x - self.origin[0]) / self.tile_size),
+                math.floor((y - self.origin[1]) / self.tile_size)]
+
+    def tile_to_world(self, tile_x: int, tile_y: int) -> list:
+        """ Returns the top left point of a tile """
+        return [self.origin[0] + tile_x * self.tile_size,
+                self.origin[1] + tile_y * self.tile_size]
+
+    # =============================
+    # ---  Queries  ---------------
+    # =============================
+
+    def is_solid(self, tile_x: int, tile_y: int) -> bool:
+        """ Returns if the tile at the grid coords blocks.
+            Tiles outside the loaded tiles don't.
+        """
+        x = tile_x - self.offset[0]
+        y = tile_y - self.offset[1]
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self._solid_view[x, y]
+        return False
+
+    def is_solid_at(self, x, y) -> bool:
+        """ Returns if the tile under a point blocks """
+        tile = self.world_to_tile(x, y)
+        return self.is_solid(tile[0], tile[1])
+
+    def tiles_in_rect(self, rect: pygame.Rect, solid_only: bool = False) -> list:  # noqa
+        """ Returns the grid coords of the tiles a rect overlaps """
+        min_tile = self.world_to_tile(rect.left, rect.top)
+        max_tile = self.world_to_tile(rect.right - 1, rect.bottom - 1)
+        # Clamp to the loaded tiles, in array coords:
+        ox, oy = self.offset
+        min_x = max(min_tile[0] - ox, 0)
+        min_y = max(min_tile[1] - oy, 0)
+        max_x = min(max_tile[0] - ox, self.width - 1)
+        max_y = min(max_tile[1] - oy, self.height - 1)
+        if min_x > max_x or min_y > max_y:
+            return []
+
+        if solid_only:
+            xs, ys = np.nonzero(
+                self.solid[min_x:max_x + 1, min_y:max_y + 1])
+            return [[x + min_x + ox, y + min_y + oy]
+                    for x, y in zip(xs.tolist(), ys.tolist())]
+        return [[x + ox, y + oy] for x in range(min_x, max_x + 1)
+                for y in range(min_y, max_y + 1)]
+
+    def set_tile_ray_hit(self, tile_index: int, b: bool) -> None:
+        """ Sets if a tile is hit by a ray """
+        if b:
+            self.ray_hit_tiles.add(tile_index)
+        else:
+            self.ray_hit_tiles.discard(tile_index)
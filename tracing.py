@@ -0,0 +1,163 @@
+"""
+Frame Tracing
+
+Writes spans of the game loop to a Chrome Trace Event JSON file,
+which can be opened in chrome://tracing or ui.perfetto.dev.
+
+Spans are queued and written by a background thread,
+so a frame only pays for putting a tuple on a queue.
+The queue has a max size; if the writer falls behind,
+new spans are dropped and counted instead of stalling the frame.
+Each span is a complete ('X') event holding its start and duration,
+so a dropped span never leaves a begin without an end.
+"""
+
+# Imports:
+import json
+import os
+import queue
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+class TraceWriter:
+    """ Streams trace spans to a Chrome Trace Event JSON file """
+
+    DEFAULT_MAX_QUEUED = 100000
+    DEFAULT_CATEGORY = 'game'
+
+    # Put on the queue to stop the writer thread:
+    _STOP = None
+
+    def __init__(self, path: str, max_queued: int = DEFAULT_MAX_QUEUED):
+        """ Class initilizer. Opens the file and starts the writer.
+
+        Args:
+            path (str): The .json file to write.
+            max_queued (int): Spans held in memory before dropping.
+        """
+        self.path = path
+        self.queue = queue.Queue(max_queued)
+        self.pid = os.getpid()
+        # Trace times are in microseconds from when tracing started:
+        self.start_time = time.perf_counter()
+        self.written = 0
+        self.dropped = 0
+        self.closed = False
+
+        self._file = open(path, 'w')
+        self._thread = threading.Thread(
+            target=self._write_loop, name='trace-writer', daemon=True)
+        self._thread.start()
+
+    # =============================
+    # ---  Recording  -------------
+    # =============================
+
+    @staticmethod
+    def now() -> float:
+        """ Returns the clock spans are timed with, in seconds """
+        return time.perf_counter()
+
+    def complete(self, name: str, start: float, end: float = None,
+                 category: str = DEFAULT_CATEGORY) -> None:
+        """ Records a span that began at start and ended at end,
+            both from now(). end defaults to now.
+        """
+        if end is None:
+            end = time.perf_counter()
+        try:
+            self.queue.put_nowait(
+                (name, category, start, end, threading.get_ident()))
+        except queue.Full:
+            self.dropped += 1
+
+    @contextmanager
+    def span(self, name: str, category: str = DEFAULT_CATEGORY):
+        """ Records the time spent inside a with block """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, start, category=category)
+
+    def close(self) -> dict:
+        """ Writes the queued spans, closes the file and
+            returns how many spans were written and dropped.
+        """
+        if not self.closed:
+            self.closed = True
+            # Blocks until there is room, the frames are done by now:
+            self.queue.put(self._STOP)
+            self._thread.join()
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        """ Returns the path and how many spans were written and dropped """
+        return {
+            'path': self.path,
+            'written': self.written,
+            'dropped': self.dropped,
+            'queued': self.queue.qsize(),
+        }
+
+    # =============================
+    # ---  Writer thread  ---------
+    # =============================
+
+    def _to_event(self, span) -> dict:
+        """ Turns a queued span in to a trace event """
+        name, category, start, end, thread_id = span
+        return {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.start_time) * 1000000,
+            'dur': (end - start) * 1000000,
+            'pid': self.pid,
+            'tid': thread_id,
+        }
+
+    def _write_loop(self) -> None:
+        """ Writes spans as they come in until told to stop """
+        out = self._file
+        out.write('[\n')
+        out.write(json.dumps({
+            'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+            'args': {'name': 'Pygame-Topdown'},
+        }))
+        get = self.queue.get
+        while True:
+            span = get()
+            if span is self._STOP:
+                break
+            out.write(',\n')
+            out.write(json.dumps(self._to_event(span)))
+            self.written += 1
+        out.write('\n]\n')
+        out.close()
+
+
+class _NullSpan:
+    """ Does nothing, used when not tracing """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def trace_span(tracer: TraceWriter, name: str,
+               category: str = TraceWriter.DEFAULT_CATEGORY):
+    """ Returns a with block span, or one that does nothing
+        if tracer is None.
+    """
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, category)
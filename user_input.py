@@ -1,8 +1,19 @@
 """
 Get User inputs
+
+Keys are bound to actions in bindings.json by their pygame key name.
+Key events are looked up by key code straight to their action.
+
+In polling mode the keyboard is read once a frame with
+pygame.key.get_pressed instead of from the key events.
+Either way the pressed and released flags and the move direction
+are worked out once a frame, not for each event.
 """
 
 # imports
+import json
+import os
+import pygame
 from pygame import locals as pgl
 from gamebase import GameBase
 
@@ -40,60 +51,132 @@ class UserInputs:
         SELECT,
     ]
 
+    # Key names for each action, used if there is no bindings file:
+    BINDINGS_PATH = 'bindings.json'
+    DEFAULT_BINDINGS = {
+        MOVE_LEFT: ['a'],
+        MOVE_RIGHT: ['d'],
+        MOVE_UP: ['w'],
+        MOVE_DOWN: ['s'],
+        JUMP: ['left shift'],
+        ATTACK: ['space'],
+        ALT_ATTACK: ['q'],
+        MENU: ['escape'],
+        SELECT: ['tab'],
+    }
+
     last_key_state = {}
     is_key_just_pressed = {}
     is_key_pressed = {}
     is_key_just_released = {}
 
+    # Action -> key codes bound to it:
     key_codes = None
+    # Key code -> action, so a key event is one lookup:
+    key_actions = None
+    # Bound keys that are down, in event mode:
+    held_keys = set()
     move_direction = [0, 0]
 
+    # Reads the keyboard once a frame instead of the key events:
+    polling = False
+
     # game: GameBase
-    def __init__(self, game: GameBase):
-        """ Class Initilization method """
+    def __init__(self, game: GameBase, bindings_path: str = BINDINGS_PATH,
+                 polling: bool = False):
+        """ Class Initilization method
+
+        Args:
+            game (GameBase): The game to get the events from.
+            bindings_path (str): Json file of action to key names.
+            polling (bool): Read the keyboard instead of key events.
+        """
         # Makes sure only single instance
         if UserInputs.TOTAL_INSTANCES >= 1:
             return
         UserInputs.TOTAL_INSTANCES += 1
         UserInputs.game = game
-        self.set_keys()
+        UserInputs.polling = polling
+        self.set_keys(bindings_path)
 
-    def set_keys(self):
-        """ Sets up initial key setup"""
-        # TODO: Set up a load key set from config file
-        # But right now it's being hard coded:
-        UserInputs.key_codes = {
-            UserInputs.key_list[0]: pgl.K_a,
-            UserInputs.key_list[1]: pgl.K_d,
-            UserInputs.key_list[2]: pgl.K_w,
-            UserInputs.key_list[3]: pgl.K_s,
-            UserInputs.key_list[4]: pgl.K_LSHIFT,
-            UserInputs.key_list[5]: pgl.K_SPACE,
-            UserInputs.key_list[6]: pgl.K_q,
-            UserInputs.key_list[7]: pgl.K_ESCAPE,
-            UserInputs.key_list[8]: pgl.K_TAB
-        }
-        # Initiate all key states to False
-        for key in UserInputs.key_list:
+    def load_bindings(self, bindings_path: str) -> dict:
+        """ Returns the action to key names in the bindings file,
+            or the default ones if there isn't one.
+        """
+        if bindings_path is None or not os.path.exists(bindings_path):
+            return UserInputs.DEFAULT_BINDINGS
+        with open(bindings_path) as f:
+            return json.load(f)
+
+    def set_bindings(self, bindings: dict) -> None:
+        """ Binds each action to its key names.
+            A key name can be a string or a list of them.
+        """
+        key_codes = {}
+        key_actions = {}
+        for action, names in bindings.items():
+            if isinstance(names, str):
+                names = [names]
+            codes = []
+            for name in names:
+                # Raises ValueError for names pygame doesn't know:
+                code = pygame.key.key_code(name)
+                if code in key_actions:
+                    raise ValueError(
+                        f'Key "{name}" is bound to both '
+                        f'{key_actions[code]} and {action}')
+                key_actions[code] = action
+                codes.append(code)
+            key_codes[action] = tuple(codes)
+        UserInputs.key_codes = key_codes
+        UserInputs.key_actions = key_actions
+        UserInputs.held_keys.clear()
+
+        # Actions in the bindings file can be more than the key_list:
+        for key in UserInputs.key_list + list(key_codes):
+            UserInputs.key_codes.setdefault(key, ())
             UserInputs.is_key_pressed[key] = False
             UserInputs.last_key_state[key] = False
             UserInputs.is_key_just_pressed[key] = False
             UserInputs.is_key_just_released[key] = False
 
+    def set_keys(self, bindings_path: str = BINDINGS_PATH):
+        """ Sets up initial key setup"""
+        # Initiate all key states to False
+        self.set_bindings(self.load_bindings(bindings_path))
+
         # Sends key Input methods to game loop:
         UserInputs.game.add_to_update_event_functions(self.send_to_update)
+        UserInputs.game.add_to_input_functions(self.update_key_states)
         UserInputs.game.add_to_update_late_functions(self.send_to_late_update)
 
+    def set_polling(self, b: bool) -> None:
+        """ Sets reading the keyboard each frame instead of key events """
+        UserInputs.polling = b
+        UserInputs.held_keys.clear()
+
     def set_key_is_down(self, event):
         """ Check if key is down, then sets the value if it is or isn't. """
+        if event.type != pgl.KEYDOWN and event.type != pgl.KEYUP:
+            return
+        action = UserInputs.key_actions.get(event.key)
+        if action is None:
+            return
+        held = UserInputs.held_keys
         if event.type == pgl.KEYDOWN:
-            for key in UserInputs.is_key_pressed:
-                if event.key == UserInputs.key_codes[key]:
-                    UserInputs.is_key_pressed[key] = True
-        if event.type == pgl.KEYUP:
-            for key in UserInputs.is_key_pressed:
-                if event.key == UserInputs.key_codes[key]:
-                    UserInputs.is_key_pressed[key] = False
+            held.add(event.key)
+        else:
+            held.discard(event.key)
+        # Still down if any other key for the action is:
+        UserInputs.is_key_pressed[action] = any(
+            code in held for code in UserInputs.key_codes[action])
+
+    def poll_keys(self) -> None:
+        """ Sets every action from the keyboard's state """
+        pressed = pygame.key.get_pressed()
+        for action, codes in UserInputs.key_codes.items():
+            UserInputs.is_key_pressed[action] = any(
+                pressed[code] for code in codes)
 
     # Consumes the flags. Turns them from True to False:
     def consume_just_pressed_key(self, key):
@@ -106,7 +189,7 @@ class UserInputs:
 
     def consume_all_keys(self):
         """ Consumes all Key is pressed and released flags """
-        for key in UserInputs.key_list:
+        for key in UserInputs.is_key_pressed:
             UserInputs.is_key_just_pressed[key] = False
             UserInputs.is_key_just_released[key] = False
 
@@ -117,34 +200,34 @@ class UserInputs:
 
     def key_pressed(self, key):
         """ Returns if the key was just pressed this frame """
-        if not UserInputs.last_key_state[key] and UserInputs.is_key_pressed[key]:  # noqa
-            UserInputs.is_key_just_pressed[key] = True
         return UserInputs.is_key_just_pressed[key]
 
     def key_released(self, key):
         """ Checks if the key was just released this frame """
-        if UserInputs.last_key_state[key] and not UserInputs.is_key_pressed[key]:  # noqa
-            UserInputs.is_key_just_released[key] = True
-        return UserInputs.is_key_just_pressed[key]
+        return UserInputs.is_key_just_released[key]
 
     # Set key states:
+    def set_just_key_states(self):
+        """ Sets the just pressed and released flags once a frame """
+        last = UserInputs.last_key_state
+        for key, down in UserInputs.is_key_pressed.items():
+            UserInputs.is_key_just_pressed[key] = down and not last[key]
+            UserInputs.is_key_just_released[key] = last[key] and not down
+
     def set_last_key_state(self):
         """ Sets all key states at the end of the loop """
-        for key in UserInputs.key_list:
-            UserInputs.last_key_state[key] = UserInputs.is_key_pressed[key]
+        for key, down in UserInputs.is_key_pressed.items():
+            UserInputs.last_key_state[key] = down
 
     # sets movement information for the player
     def move_keys_pressed(self) -> list:
         """ Sets direction for X and Y based on pressed keys """
-        UserInputs.move_direction = [0, 0]
-        if UserInputs.is_key_pressed[UserInputs.MOVE_LEFT]:
-            UserInputs.move_direction[0] -= 1
-        if UserInputs.is_key_pressed[UserInputs.MOVE_RIGHT]:
-            UserInputs.move_direction[0] += 1
-        if UserInputs.is_key_pressed[UserInputs.MOVE_DOWN]:
-            UserInputs.move_direction[1] += 1
-        if UserInputs.is_key_pressed[UserInputs.MOVE_UP]:
-            UserInputs.move_direction[1] -= 1
+        pressed = UserInputs.is_key_pressed
+        UserInputs.move_direction = [
+            pressed[UserInputs.MOVE_RIGHT] - pressed[UserInputs.MOVE_LEFT],
+            pressed[UserInputs.MOVE_DOWN] - pressed[UserInputs.MOVE_UP],
+        ]
+        return UserInputs.move_direction
 
     # Returns movement information for the player
     def get_movement_dir(self) -> list:
@@ -160,7 +243,16 @@ class UserInputs:
     # Sends methods to update in game loop:
     def send_to_update(self, delta, event):
         """ Sends the listed methods to game update. """
-        self.set_key_is_down(event)
+        if not UserInputs.polling:
+            self.set_key_is_down(event)
+
+    def update_key_states(self, frame_time):
+        """ Works out the flags and move direction once a frame,
+            after the events are read.
+        """
+        if UserInputs.polling:
+            self.poll_keys()
+        self.set_just_key_states()
         self.move_keys_pressed()
 
     def send_to_late_update(self, delta):